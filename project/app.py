@@ -1,12 +1,11 @@
 import streamlit as st
-import rasterio
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-from src import processing, analysis, utils
-import tempfile
+from src import analysis, utils, cache, summary, jobs, instrumentation
 import os
 
+# rasterio, matplotlib, pandas and plotly are imported only by the pages and
+# functions that use them, so cold starts and the Home/About pages skip them
+
 # Console print for student details on load
 print("--------------------------------------------------")
 print("Project: Vegetation Health Assessment and Land Cover Analysis")
@@ -19,6 +18,149 @@ print("to quantify vegetation health and land cover distribution using NDVI and"
 print("spectral clustering techniques.")
 print("--------------------------------------------------")
 
+# Stage records are also appended as JSON lines to $NDVI_STAGE_LOG if set
+instrumentation.configure_json_log()
+
+@st.cache_resource
+def get_result_cache():
+    # One size-bounded LRU cache shared by every session on this server
+    return cache.ResultCache(max_bytes=1024 ** 3)
+
+@st.cache_resource
+def get_job_manager():
+    # Background analysis workers shared by every session on this server
+    return jobs.JobManager(max_workers=2)
+
+def upload_digest(uploaded_file):
+    # Hash each upload once; reruns reuse the digest for the same file_id
+    digests = st.session_state.setdefault('upload_digests', {})
+    if uploaded_file.file_id not in digests:
+        digests[uploaded_file.file_id] = cache.content_key(uploaded_file.getbuffer())
+    return digests[uploaded_file.file_id]
+
+def compute_scene(red_path, nir_path, scene=None):
+    # NDVI is kept as float32: it stays in the result cache for every class
+    # count and is shared as level 0 of the display pyramid.
+    from src import processing
+    if not processing.band_grids_match(red_path, nir_path):
+        # Different resolution, CRS or extent: NIR is resampled onto the red
+        # grid window by window while NDVI is computed, never as a full copy
+        print("Band grids differ; aligning NIR to the red band grid...")
+        with instrumentation.stage("align_and_calculate_ndvi", scene=scene):
+            return processing.calculate_ndvi_aligned(red_path, nir_path, dtype=np.float32)
+
+    print(f"Loading bands: {red_path}, {nir_path}")
+    with instrumentation.stage("load_band", scene=scene):
+        red_band, meta_red = processing.load_band(red_path, dtype=None)
+        nir_band, meta_nir = processing.load_band(nir_path, dtype=None)
+
+    print(f"Bands loaded. Shape: {red_band.shape}")
+
+    print("Calculating NDVI...")
+    with instrumentation.stage("calculate_ndvi", scene=scene):
+        ndvi_image = processing.calculate_ndvi_float32(red_band, nir_band)
+    return ndvi_image, meta_red
+
+def classify_scene(ndvi_image, meta_red, n_clusters, scene=None):
+    print(f"Performing clustering with {n_clusters} classes...")
+    with instrumentation.stage("perform_kmeans_clustering", scene=scene, n_clusters=n_clusters):
+        classified_map, centers = analysis.perform_kmeans_clustering(ndvi_image, n_clusters=n_clusters)
+
+    # Extract high-precision pixel dimensions from Affine transform
+    transform = meta_red['transform']
+    pixel_size_x = transform[0]
+    pixel_size_y = transform[4]
+    print(f"Pixel dimensions: {pixel_size_x} x {pixel_size_y}")
+
+    # Geographic grids get per-row cell areas instead of a flat 111 km/degree
+    pixel_area = analysis.pixel_area_from_meta(meta_red, classified_map.shape)
+
+    with instrumentation.stage("calculate_area_statistics", scene=scene, n_clusters=n_clusters):
+        stats = analysis.calculate_area_statistics(classified_map, pixel_size_x, pixel_size_y, pixel_area=pixel_area)
+    print(f"Statistics calculated: {stats}")
+    return classified_map, centers, stats
+
+def run_analysis(report, result_cache, scene_key, n_clusters, red_path, nir_path):
+    # Runs on a JobManager worker thread, so it must not call any st.* API.
+    # Intermediate results go through the shared cache: NDVI is reused for
+    # every class count, clustering per class count.
+    try:
+        report("Loading bands and computing NDVI", 0.05)
+        ndvi_image, meta_red = result_cache.get_or_compute(
+            scene_key, lambda: compute_scene(red_path, nir_path, scene_key)
+        )
+
+        # Histogram, range and mean in one pass over the scene
+        report("Summarising NDVI distribution", 0.4)
+        ndvi_summary = result_cache.get_or_compute(
+            cache.content_key(scene_key, 'summary'),
+            lambda: summary.summarize_ndvi(ndvi_image)
+        )
+        print(f"NDVI calculated. Range: {ndvi_summary.min} to {ndvi_summary.max}")
+
+        # Clustering and area statistics depend only on the scene and class count
+        report("Clustering spectral classes", 0.5)
+        classified_map, centers, stats = result_cache.get_or_compute(
+            cache.content_key(scene_key, n_clusters),
+            lambda: classify_scene(ndvi_image, meta_red, n_clusters, scene_key)
+        )
+
+        # Downsampled pyramids, built once per result, keep rendering
+        # cost tied to the figure size instead of the scene size. Only the
+        # coarser levels are cached here: level 0 is the cached NDVI / class
+        # map itself, so the full-size arrays are held (and counted) once.
+        # The job result only carries cache keys plus the small summary and
+        # statistics.
+        report("Building map overviews", 0.85)
+        classes_key = cache.content_key(scene_key, n_clusters)
+        ndvi_pyramid_key = cache.content_key(scene_key, 'pyramid')
+        cls_pyramid_key = cache.content_key(scene_key, n_clusters, 'pyramid')
+        result_cache.get_or_compute(
+            ndvi_pyramid_key,
+            lambda: utils.build_pyramid(ndvi_image, reducer="mean")[1:]
+        )
+        result_cache.get_or_compute(
+            cls_pyramid_key,
+            lambda: utils.build_pyramid(classified_map, reducer="nearest")[1:]
+        )
+        return {
+            'ndvi_summary': ndvi_summary,
+            'stats': stats,
+            'scene_key': scene_key,
+            'classes_key': classes_key,
+            'ndvi_pyramid_key': ndvi_pyramid_key,
+            'cls_pyramid_key': cls_pyramid_key,
+        }
+    finally:
+        for path in (red_path, nir_path):
+            if path and os.path.exists(path): os.remove(path)
+
+def start_analysis(uploaded_red, uploaded_nir, scene_key, n_clusters, rerun=False):
+    # Returns the existing job for these inputs, including a failed one so its
+    # error can be shown; `rerun` submits a fresh job once it has finished.
+    job_manager = get_job_manager()
+    analysis_key = cache.content_key(scene_key, n_clusters, 'analysis')
+    job = job_manager.find(analysis_key)
+    if job is not None and not (rerun and job.done):
+        return job
+
+    # The cached NDVI may be evicted before a queued job runs, so the
+    # uploads are always spooled; run_analysis deletes them when it ends.
+    red_path = job_manager.spool(uploaded_red)
+    nir_path = job_manager.spool(uploaded_nir)
+    return job_manager.submit(
+        analysis_key, run_analysis, get_result_cache(), scene_key, n_clusters, red_path, nir_path, replace=rerun
+    )
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job_id):
+    # Polls the background job without rerunning the whole page; once the
+    # job finishes, a full rerun renders its results.
+    job = get_job_manager().get(job_id)
+    if job is None or job.done:
+        st.rerun(scope="app")
+    st.progress(job.progress, text=f"{job.stage}...")
+
 st.set_page_config(
     page_title="ISA - Vegetation Health Assessment", 
     layout="wide"
@@ -94,97 +236,131 @@ elif "Analysis" in page:
 
     st.sidebar.header("Calibration Controls")
     n_clusters = st.sidebar.slider("Spectral Classes", min_value=2, max_value=8, value=4)
+    show_performance = st.sidebar.checkbox("Show performance panel", value=False)
 
     if uploaded_red and uploaded_nir:
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.tif') as tmp_red:
-                tmp_red.write(uploaded_red.getvalue())
-                red_path = tmp_red.name
-                
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.tif') as tmp_nir:
-                tmp_nir.write(uploaded_nir.getvalue())
-                nir_path = tmp_nir.name
-
-            with st.spinner("Executing analytical subroutines..."):
-                print(f"Loading bands: {red_path}, {nir_path}")
-                red_band, meta_red = processing.load_band(red_path)
-                nir_band, meta_nir = processing.load_band(nir_path)
-                
-                print(f"Bands loaded. Shape: {red_band.shape}")
-                
-                if red_band.shape != nir_band.shape:
-                    st.error("Error: Radiomatric mismatch. Band dimensions must be identical.")
+            scene_key = cache.content_key(upload_digest(uploaded_red), upload_digest(uploaded_nir))
+            job = start_analysis(uploaded_red, uploaded_nir, scene_key, n_clusters)
+
+            # Finished results point into the shared cache; if their maps or
+            # overviews were evicted since, run the analysis again (once: a
+            # rerun whose maps are gone too means they cannot fit)
+            result_cache = get_result_cache()
+            eviction_reruns = st.session_state.setdefault('eviction_reruns', set())
+            if job.status == "done":
+                scene_entry = result_cache.get(job.result['scene_key'])
+                classes_entry = result_cache.get(job.result['classes_key'])
+                ndvi_overviews = result_cache.get(job.result['ndvi_pyramid_key'])
+                cls_overviews = result_cache.get(job.result['cls_pyramid_key'])
+                if any(entry is None for entry in (scene_entry, classes_entry, ndvi_overviews, cls_overviews)):
+                    if job.id in eviction_reruns:
+                        raise RuntimeError("Maps for this scene do not fit in the result cache.")
+                    job = start_analysis(uploaded_red, uploaded_nir, scene_key, n_clusters, rerun=True)
+                    eviction_reruns.add(job.id)
                 else:
-                    print("Calculating NDVI...")
-                    ndvi_image = processing.calculate_ndvi(red_band, nir_band)
-                    print(f"NDVI calculated. Range: {np.nanmin(ndvi_image)} to {np.nanmax(ndvi_image)}")
-                    
-                    print(f"Performing clustering with {n_clusters} classes...")
-                    classified_map, centers = analysis.perform_kmeans_clustering(ndvi_image, n_clusters=n_clusters)
-                    
-                    # Extract high-precision pixel dimensions from Affine transform
-                    transform = meta_red['transform']
-                    pixel_size_x = transform[0]
-                    pixel_size_y = transform[4]
-                    print(f"Pixel dimensions: {pixel_size_x} x {pixel_size_y}")
-                    
-                    stats = analysis.calculate_area_statistics(classified_map, pixel_size_x, pixel_size_y)
-                    print(f"Statistics calculated: {stats}")
-                    
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.subheader("NDVI Spectral Heatmap")
+                    ndvi_pyramid = [scene_entry[0]] + ndvi_overviews
+                    cls_pyramid = [classes_entry[0]] + cls_overviews
+
+            if not job.done:
+                st.info("Analysis is running in the background. You can keep using the app; results appear here when ready.")
+                show_job_progress(job.id)
+            elif job.status == "failed":
+                st.error(f"System Operational Error: {job.error}")
+                if st.button("Retry analysis"):
+                    start_analysis(uploaded_red, uploaded_nir, scene_key, n_clusters, rerun=True)
+                    st.rerun()
+            else:
+                import matplotlib.pyplot as plt
+                import pandas as pd
+
+                ndvi_summary = job.result['ndvi_summary']
+                stats = job.result['stats']
+                with st.sidebar.expander("Map Zoom"):
+                    zoom = st.select_slider("Zoom", options=[2 ** i for i in range(len(ndvi_pyramid) + 1)], value=1, format_func=lambda z: f"{z}x")
+                    center_x = st.slider("Centre (horizontal)", 0.0, 1.0, 0.5, disabled=zoom == 1)
+                    center_y = st.slider("Centre (vertical)", 0.0, 1.0, 0.5, disabled=zoom == 1)
+
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.subheader("NDVI Spectral Heatmap")
+                    with instrumentation.stage("render_ndvi_map", scene=scene_key, zoom=zoom):
                         fig_ndvi, ax_ndvi = plt.subplots(figsize=(10, 10))
                         cmap = utils.create_ndvi_colormap()
-                        im = ax_ndvi.imshow(ndvi_image, cmap=cmap, vmin=-1, vmax=1)
+                        ndvi_view, extent = utils.display_view(ndvi_pyramid, zoom=zoom, center=(center_x, center_y))
+                        im = ax_ndvi.imshow(ndvi_view, cmap=cmap, vmin=-1, vmax=1, extent=extent)
                         plt.colorbar(im, ax=ax_ndvi, label="Normalised Difference Vegetation Index")
                         ax_ndvi.axis('off')
                         st.pyplot(fig_ndvi)
-                        
-                    with col2:
-                        st.subheader("Categorified Spectral Zones")
+                    
+                with col2:
+                    st.subheader("Categorified Spectral Zones")
+                    with instrumentation.stage("render_class_map", scene=scene_key, zoom=zoom):
                         fig_cls, ax_cls = plt.subplots(figsize=(10, 10))
-                        masked_cls = np.ma.masked_where(classified_map == -1, classified_map)
+                        cls_view, extent = utils.display_view(cls_pyramid, zoom=zoom, center=(center_x, center_y))
+                        masked_cls = np.ma.masked_where(cls_view == -1, cls_view)
                         cmap_cls = plt.get_cmap("RdYlGn", n_clusters)
-                        im_cls = ax_cls.imshow(masked_cls, cmap=cmap_cls)
+                        im_cls = ax_cls.imshow(masked_cls, cmap=cmap_cls, extent=extent, interpolation='nearest')
                         plt.colorbar(im_cls, ax=ax_cls, ticks=range(n_clusters), label="Class ID")
                         ax_cls.axis('off')
                         st.pyplot(fig_cls)
 
-                    # Save figures for the Print Report page
-                    st.session_state['last_ndvi_fig'] = fig_ndvi
-                    st.session_state['last_cls_fig'] = fig_cls
+                # Encode the report maps once per view and keep only the
+                # compressed bytes; the Figures are closed to free their memory
+                report_view = (scene_key, n_clusters, zoom, center_x, center_y)
+                if st.session_state.get('last_report_view') != report_view:
+                    with instrumentation.stage("encode_report_images", scene=scene_key):
+                        st.session_state['last_ndvi_image'] = utils.encode_figure(fig_ndvi)
+                        st.session_state['last_cls_image'] = utils.encode_figure(fig_cls, lossless=True)
+                    st.session_state['last_report_view'] = report_view
+                plt.close(fig_ndvi)
+                plt.close(fig_cls)
+
+                st.divider()
+                col3, col4 = st.columns(2)
+                
+                with col3:
+                   st.subheader("Quantitative Statistics")
+                   if stats:
+                       df_stats = pd.DataFrame([
+                           {"Zone": f"Spectral Class {k}", "Area (km2)": v} for k, v in stats.items()
+                       ])
+                       st.dataframe(df_stats, width='stretch', hide_index=True)
+                       st.bar_chart(df_stats.set_index("Zone"))
+                   else:
+                       st.warning("Insufficient valid land data identified for area quantification.")
+
+                with col4:
+                    st.subheader("Spectral Intensity Distribution")
+                    hist_fig = utils.plot_ndvi_histogram(ndvi_summary)
+                    st.plotly_chart(hist_fig, width='stretch')
+
+                st.success("Analysis finalized successfully.")
+                
+                st.session_state['last_stats'] = stats
+                st.session_state['last_ndvi_range'] = (ndvi_summary.min, ndvi_summary.max)
+                st.session_state['last_scene_key'] = scene_key
 
+                if show_performance:
                     st.divider()
-                    col3, col4 = st.columns(2)
-                    
-                    with col3:
-                       st.subheader("Quantitative Statistics")
-                       if stats:
-                           df_stats = pd.DataFrame([
-                               {"Zone": f"Spectral Class {k}", "Area (km2)": v} for k, v in stats.items()
-                           ])
-                           st.dataframe(df_stats, width='stretch', hide_index=True)
-                           st.bar_chart(df_stats.set_index("Zone"))
-                       else:
-                           st.warning("Insufficient valid land data identified for area quantification.")
-
-                    with col4:
-                        st.subheader("Spectral Intensity Distribution")
-                        hist_fig = utils.plot_ndvi_histogram(ndvi_image)
-                        st.plotly_chart(hist_fig, width='stretch')
-
-                    st.success("Analysis finalized successfully.")
-                    
-                    st.session_state['last_stats'] = stats
-                    st.session_state['last_ndvi_range'] = (float(np.nanmin(ndvi_image)), float(np.nanmax(ndvi_image)))
-                    
+                    st.subheader("Performance")
+                    # Cached stages only appear for the run that computed them
+                    records = instrumentation.RECORDER.records(scene=scene_key)
+                    if records:
+                        perf_df = pd.DataFrame(records).drop(columns=["scene"])
+                        st.dataframe(perf_df, width='stretch', hide_index=True)
+                        st.download_button(
+                            "Download stage timings (JSON)",
+                            data=instrumentation.RECORDER.to_json(scene=scene_key),
+                            file_name="stage_timings.json",
+                            mime="application/json",
+                        )
+                    else:
+                        st.caption("No stage timings recorded for this scene yet.")
+                
         except Exception as e:
             st.error(f"System Operational Error: {e}")
-        finally:
-            if 'red_path' in locals(): os.remove(red_path)
-            if 'nir_path' in locals(): os.remove(nir_path)
     else:
         st.info("Awaiting multi-spectral band upload to initialize processing.")
 
@@ -193,37 +369,34 @@ elif "Print" in page:
     st.write("Indian Space Academy - Winter Training Program 2026")
 
     if 'last_stats' in st.session_state:
-        import io
         import base64
+        import pandas as pd
 
         ndvi_min, ndvi_max = st.session_state['last_ndvi_range']
         stats = st.session_state['last_stats']
         n_classes = len(stats)
 
-        # Encode NDVI figure to base64
-        ndvi_b64 = ""
-        cls_b64 = ""
-        if 'last_ndvi_fig' in st.session_state:
-            buf = io.BytesIO()
-            st.session_state['last_ndvi_fig'].savefig(buf, format='png', bbox_inches='tight')
-            ndvi_b64 = base64.b64encode(buf.getvalue()).decode()
-        if 'last_cls_fig' in st.session_state:
-            buf = io.BytesIO()
-            st.session_state['last_cls_fig'].savefig(buf, format='png', bbox_inches='tight')
-            cls_b64 = base64.b64encode(buf.getvalue()).decode()
-
-        # Build table rows
-        table_rows = "".join([
-            f"<tr><td>Class {k}</td><td>{v} sq. km</td></tr>"
-            for k, v in stats.items()
-        ])
-
-        # Build maps HTML
-        maps_html = ""
-        if ndvi_b64:
-            maps_html += f'<div class="map-block"><p><strong>NDVI Spectral Heatmap</strong></p><img src="data:image/png;base64,{ndvi_b64}" /></div>'
-        if cls_b64:
-            maps_html += f'<div class="map-block"><p><strong>Categorised Land Cover Map</strong></p><img src="data:image/png;base64,{cls_b64}" /></div>'
+        with instrumentation.stage("report_generation", scene=st.session_state.get('last_scene_key')):
+            # Maps were encoded at analysis time; only base64-wrap them here
+            ndvi_b64 = ""
+            cls_b64 = ""
+            if 'last_ndvi_image' in st.session_state:
+                ndvi_b64 = base64.b64encode(st.session_state['last_ndvi_image']).decode()
+            if 'last_cls_image' in st.session_state:
+                cls_b64 = base64.b64encode(st.session_state['last_cls_image']).decode()
+
+            # Build table rows
+            table_rows = "".join([
+                f"<tr><td>Class {k}</td><td>{v} sq. km</td></tr>"
+                for k, v in stats.items()
+            ])
+
+            # Build maps HTML
+            maps_html = ""
+            if ndvi_b64:
+                maps_html += f'<div class="map-block"><p><strong>NDVI Spectral Heatmap</strong></p><img src="data:{utils.REPORT_IMAGE_MIME};base64,{ndvi_b64}" /></div>'
+            if cls_b64:
+                maps_html += f'<div class="map-block"><p><strong>Categorised Land Cover Map</strong></p><img src="data:{utils.REPORT_IMAGE_MIME};base64,{cls_b64}" /></div>'
 
         html_report = f"""<!DOCTYPE html>
 <html lang="en">
@@ -318,14 +491,14 @@ elif "Print" in page:
 
         st.divider()
         st.markdown("### Generated Analysis Maps")
-        if 'last_ndvi_fig' in st.session_state and 'last_cls_fig' in st.session_state:
+        if 'last_ndvi_image' in st.session_state and 'last_cls_image' in st.session_state:
             map_col1, map_col2 = st.columns(2)
             with map_col1:
                 st.markdown("**NDVI Spectral Heatmap**")
-                st.pyplot(st.session_state['last_ndvi_fig'])
+                st.image(st.session_state['last_ndvi_image'])
             with map_col2:
                 st.markdown("**Categorised Land Cover Map**")
-                st.pyplot(st.session_state['last_cls_fig'])
+                st.image(st.session_state['last_cls_image'])
 
     else:
         st.warning("No analytical data found. Please run the Analysis Dashboard first, then return here.")
@@ -0,0 +1,50 @@
+import argparse
+import time
+import numpy as np
+from src import analysis
+
+def synthetic_ndvi(size, seed=42):
+    # Mixture of soil, sparse and dense vegetation with some water and gaps
+    rng = np.random.default_rng(seed)
+    n = size * size
+    parts = [
+        rng.normal(-0.3, 0.08, n // 10),
+        rng.normal(0.1, 0.05, n * 4 // 10),
+        rng.normal(0.4, 0.07, n * 3 // 10),
+    ]
+    parts.append(rng.normal(0.75, 0.06, n - sum(p.size for p in parts)))
+    ndvi = np.clip(np.concatenate(parts), -1.0, 1.0)
+    rng.shuffle(ndvi)
+    ndvi[rng.random(n) < 0.02] = np.nan
+    return ndvi.reshape(size, size)
+
+def time_engine(ndvi, n_clusters, engine, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        classified_map, centers = analysis.perform_kmeans_clustering(ndvi, n_clusters, engine=engine)
+        best = min(best, time.perf_counter() - start)
+    return best, classified_map, np.asarray(centers).ravel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare NDVI clustering engines.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--engines", nargs="+", default=list(analysis.CLUSTERING_ENGINES))
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'engine':>10} {'seconds':>9} {'speedup':>8} {'agreement':>9}  centers")
+    for size in args.sizes:
+        ndvi = synthetic_ndvi(size)
+        baseline_time, baseline_map = None, None
+        for engine in args.engines:
+            seconds, classified_map, centers = time_engine(ndvi, args.clusters, engine, args.repeats)
+            if baseline_time is None:
+                baseline_time, baseline_map = seconds, classified_map
+            agreement = np.mean(classified_map == baseline_map)
+            centers_text = ", ".join(f"{c:.3f}" for c in centers)
+            print(f"{size:>6} {engine:>10} {seconds:>9.3f} {baseline_time / seconds:>7.1f}x {agreement:>9.4f}  [{centers_text}]")
+
+if __name__ == "__main__":
+    main()
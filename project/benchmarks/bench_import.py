@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only be imported by the pages and functions using them
+HEAVY_MODULES = ("rasterio", "sklearn", "scipy", "matplotlib.pyplot", "pandas", "plotly.express")
+
+# What a cold start of each target executes in a fresh interpreter. "app"
+# runs the Streamlit script once in bare mode, i.e. the first page render
+# with no uploads.
+TARGETS = {
+    "app": "import runpy; runpy.run_path('app.py', run_name='__main__')",
+    "src.processing": "import src.processing",
+    "src.analysis": "import src.analysis",
+    "src.utils": "import src.utils",
+}
+
+REPORT_LOADED = f"; import sys; print('\\nLOADED', *[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+
+def parse_importtime(stderr):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package";
+    # top-level imports are the ones without indentation before the name.
+    total_us = 0
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith(" ") and not name.startswith("  "):
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + int(cumulative) / 1000
+            total_us += int(cumulative)
+    return total_us / 1000, packages
+
+def measure(statement):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement + REPORT_LOADED],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{proc.stderr[-2000:]}")
+    import_ms, packages = parse_importtime(proc.stderr)
+    return {
+        "wall_ms": wall_ms,
+        "import_ms": import_ms,
+        "heavy_loaded": proc.stdout.rsplit("LOADED", 1)[1].split(),
+        "top_packages_ms": dict(sorted(packages.items(), key=lambda kv: -kv[1])[:8]),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the app and core modules.")
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per target; the fastest is kept")
+    parser.add_argument("--output", default="import_times.json")
+    parser.add_argument("--max-app-ms", type=float, help="Exit with an error if the app's import time exceeds this")
+    parser.add_argument("--strict", action="store_true", help="Exit with an error if the app's first render loads a heavy module")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for target in args.targets:
+        runs = [measure(TARGETS[target]) for _ in range(args.repeats)]
+        best = min(runs, key=lambda r: r["import_ms"])
+        results[target] = best
+        heavy = ", ".join(best["heavy_loaded"]) or "none"
+        print(f"{target:<16} {best['import_ms']:>8.1f} ms imports {best['wall_ms']:>8.1f} ms wall  heavy: {heavy}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    app = results.get("app")
+    failed = False
+    if app and args.max_app_ms is not None and app["import_ms"] > args.max_app_ms:
+        print(f"App import time {app['import_ms']:.1f} ms exceeds {args.max_app_ms:.1f} ms")
+        failed = True
+    if app and args.strict and app["heavy_loaded"]:
+        print(f"App cold start imported {', '.join(app['heavy_loaded'])}")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
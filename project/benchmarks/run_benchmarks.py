@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+from src import processing, analysis
+from src.generate_data import generate_sample_data
+from src.instrumentation import PeakRSS
+
+def measure(func, repeats):
+    # Wall time is the best of `repeats` untraced runs, with RSS sampled over
+    # those runs only. tracemalloc slows Python-level allocation, so traced
+    # allocations come from one extra run. NumPy reports its buffers to
+    # tracemalloc, so the traced peak covers the arrays a stage allocates.
+    seconds = float("inf")
+    result = None
+    with PeakRSS() as rss:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = func()
+            seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {
+        "seconds": seconds,
+        "peak_alloc_mb": peak / (1024 * 1024),
+        "peak_rss_mb": rss.peak,
+        "rss_growth_mb": rss.growth,
+    }
+
+def benchmark_size(size, work_dir, engine, n_clusters, repeats):
+    with contextlib.redirect_stdout(io.StringIO()):
+        red_path, nir_path = generate_sample_data(work_dir, width=size, height=size)
+
+    records = []
+
+    def record(stage, func):
+        result, metrics = measure(func, repeats)
+        metrics.update(stage=stage, size=size)
+        records.append(metrics)
+        return result
+
+    red_band, meta = record("load_band", lambda: processing.load_band(red_path))
+    nir_band, _ = processing.load_band(nir_path)
+    ndvi_image = record("calculate_ndvi", lambda: processing.calculate_ndvi(red_band, nir_band))
+    del red_band, nir_band
+
+    classified_map, _ = record(
+        "perform_kmeans_clustering",
+        lambda: analysis.perform_kmeans_clustering(ndvi_image, n_clusters=n_clusters, engine=engine),
+    )
+    transform = meta["transform"]
+    pixel_area = analysis.pixel_area_from_meta(meta, classified_map.shape)
+    record(
+        "calculate_area_statistics",
+        lambda: analysis.calculate_area_statistics(classified_map, transform[0], transform[4], pixel_area=pixel_area),
+    )
+
+    output_path = os.path.join(work_dir, "ndvi.tif")
+    record("save_raster", lambda: processing.save_raster(ndvi_image, meta.copy(), output_path))
+    return records
+
+def compare(results, baseline):
+    previous = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    print(f"\n{'size':>6} {'stage':<28} {'baseline s':>11} {'current s':>10} {'ratio':>7}")
+    for r in results:
+        old = previous.get((r["size"], r["stage"]))
+        if old is None:
+            continue
+        ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        print(f"{r['size']:>6} {r['stage']:<28} {old['seconds']:>11.4f} {r['seconds']:>10.4f} {ratio:>6.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile the processing and analysis hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000], help="Square scene sizes, up to 10980")
+    parser.add_argument("--engine", choices=analysis.CLUSTERING_ENGINES, default="kmeans")
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for r in benchmark_size(size, work_dir, args.engine, args.clusters, args.repeats):
+                rss = "rss n/a" if r['peak_rss_mb'] is None else f"{r['peak_rss_mb']:>9.1f} MB rss (+{r['rss_growth_mb']:.1f})"
+                print(f"{r['size']:>6} {r['stage']:<28} {r['seconds']:>9.4f} s {r['peak_alloc_mb']:>9.1f} MB alloc {rss}")
+                results.append(r)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "engine": args.engine,
+        "clusters": args.clusters,
+        "repeats": args.repeats,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,141 @@
 import numpy as np
-from sklearn.cluster import KMeans
 
-def perform_kmeans_clustering(ndvi_data, n_clusters=4):
+CLUSTERING_ENGINES = ("kmeans", "histogram", "minibatch")
+
+def label_dtype(n_classes):
+    # Smallest signed type holding labels 0..n_classes-1 and -1 for invalid
+    # pixels: int8 for any practical class count, an eighth of int64
+    return np.min_scalar_type(-max(n_classes, 1))
+
+def perform_kmeans_clustering(ndvi_data, n_clusters=4, engine="kmeans", n_bins=4096):
+    if engine not in CLUSTERING_ENGINES:
+        raise ValueError(f"Unknown clustering engine '{engine}', expected one of {CLUSTERING_ENGINES}")
+
     valid_mask = ~np.isnan(ndvi_data)
     valid_data = ndvi_data[valid_mask].reshape(-1, 1)
-    
+
     if valid_data.size == 0:
-        return np.full(ndvi_data.shape, -1), []
+        return np.full(ndvi_data.shape, -1, dtype=np.int8), []
+
+    if engine == "histogram":
+        centers = histogram_kmeans_centers(valid_data.ravel(), n_clusters, n_bins)
+        return assign_to_centers(ndvi_data, valid_mask, valid_data.ravel(), centers)
+
+    # scikit-learn takes seconds to import, so only the engines that use it load it
+    if engine == "minibatch":
+        from sklearn.cluster import MiniBatchKMeans
+        _, counts = bin_values(valid_data.ravel(), n_bins)
+        actual_clusters = min(n_clusters, np.count_nonzero(counts))
+        kmeans = MiniBatchKMeans(n_clusters=actual_clusters, random_state=42, batch_size=4096, n_init=3)
+        kmeans.fit(valid_data)
+        centers = np.sort(kmeans.cluster_centers_.flatten())
+        return assign_to_centers(ndvi_data, valid_mask, valid_data.ravel(), centers)
 
+    from sklearn.cluster import KMeans
     unique_vals = np.unique(valid_data)
     actual_clusters = min(n_clusters, len(unique_vals))
 
     kmeans = KMeans(n_clusters=actual_clusters, random_state=42, n_init=10)
     kmeans.fit(valid_data)
-    
+
     sorted_indices = np.argsort(kmeans.cluster_centers_.flatten())
-    mapping = {old_idx: new_idx for new_idx, old_idx in enumerate(sorted_indices)}
-    
-    labels = kmeans.labels_
-    remapped_labels = np.array([mapping[l] for l in labels])
-    
-    classified_map = np.full(ndvi_data.shape, -1, dtype=int)
+    lookup = np.empty_like(sorted_indices)
+    lookup[sorted_indices] = np.arange(sorted_indices.size)
+
+    remapped_labels = lookup[kmeans.labels_]
+
+    classified_map = np.full(ndvi_data.shape, -1, dtype=label_dtype(n_clusters))
     classified_map[valid_mask] = remapped_labels
-    
+
     return classified_map, kmeans.cluster_centers_[sorted_indices]
 
-def calculate_area_statistics(classified_map, pixel_size_x, pixel_size_y):
-    unique, counts = np.unique(classified_map, return_counts=True)
-    is_geographic = abs(pixel_size_x) < 0.1 
-    
+def bin_values(values, n_bins):
+    lo, hi = float(values.min()), float(values.max())
+    if lo == hi:
+        return np.array([lo]), np.array([values.size], dtype=float)
+    counts, edges = np.histogram(values, bins=n_bins, range=(lo, hi))
+    centers = (edges[:-1] + edges[1:]) / 2
+    return centers, counts.astype(float)
+
+def histogram_kmeans_centers(values, n_clusters, n_bins=4096, max_iter=300, tol=1e-9):
+    # NDVI is one-dimensional, so k-means can run on a fine histogram of the
+    # data (bin centers weighted by counts) instead of on every pixel.
+    bin_centers, weights = bin_values(values, n_bins)
+    occupied = weights > 0
+    bin_centers, weights = bin_centers[occupied], weights[occupied]
+    k = min(n_clusters, bin_centers.size)
+
+    # Weighted quantiles are a deterministic, well-spread starting point
+    cumulative = np.cumsum(weights) / weights.sum()
+    quantiles = (np.arange(k) + 0.5) / k
+    centers = bin_centers[np.searchsorted(cumulative, quantiles)].astype(float)
+    centers = np.unique(centers)
+    if centers.size < k:
+        extra = np.setdiff1d(bin_centers, centers)[:k - centers.size]
+        centers = np.sort(np.concatenate([centers, extra]))
+
+    for _ in range(max_iter):
+        labels = np.searchsorted((centers[:-1] + centers[1:]) / 2, bin_centers)
+        totals = np.bincount(labels, weights=weights, minlength=k)
+        sums = np.bincount(labels, weights=weights * bin_centers, minlength=k)
+        new_centers = np.where(totals > 0, sums / np.maximum(totals, 1e-300), centers)
+        new_centers.sort()
+        shift = np.abs(new_centers - centers).max()
+        centers = new_centers
+        if shift <= tol:
+            break
+
+    return centers
+
+def assign_to_centers(ndvi_data, valid_mask, valid_values, centers):
+    # With sorted 1-D centers, the nearest center is found by comparing against
+    # the midpoints between neighbours, which keeps the sorted labelling.
+    centers = np.asarray(centers, dtype=float).ravel()
+    thresholds = (centers[:-1] + centers[1:]) / 2
+    classified_map = np.full(ndvi_data.shape, -1, dtype=label_dtype(centers.size))
+    classified_map[valid_mask] = np.searchsorted(thresholds, valid_values)
+    return classified_map, centers.reshape(-1, 1)
+
+def pixel_area_grid(transform, shape):
+    # Exact cell area on the WGS84 authalic sphere for geographic grids: the
+    # area of a lat/lon cell shrinks with cos(latitude), so a single
+    # 111 km-per-degree factor overstates area away from the equator.
+    earth_radius_km = 6371.0072
+    rows = np.arange(shape[0] + 1)
+    lat_edges = np.radians(transform.f + rows * transform.e)
+    band_area = np.abs(np.diff(np.sin(lat_edges))) * earth_radius_km ** 2
+    return (band_area * np.radians(abs(transform.a))).reshape(-1, 1)
+
+def pixel_area_from_meta(meta, shape):
+    crs = meta.get('crs')
+    if crs is None or not crs.is_geographic:
+        return None
+    return pixel_area_grid(meta['transform'], shape)
+
+def flat_pixel_area_km2(pixel_size_x, pixel_size_y):
+    is_geographic = abs(pixel_size_x) < 0.1
+
     if is_geographic:
-        pixel_area_km2 = abs(pixel_size_x * 111) * abs(pixel_size_y * 111)
+        return abs(pixel_size_x * 111) * abs(pixel_size_y * 111)
+    pixel_area_m2 = abs(pixel_size_x * pixel_size_y)
+    return pixel_area_m2 / 1_000_000
+
+def calculate_area_statistics(classified_map, pixel_size_x, pixel_size_y, pixel_area=None):
+    valid = classified_map >= 0
+    labels = classified_map[valid]
+    if labels.size == 0:
+        return {}
+
+    if pixel_area is not None:
+        weights = np.broadcast_to(pixel_area, classified_map.shape)[valid]
+        areas = np.bincount(labels, weights=weights)
+        counts = np.bincount(labels, minlength=areas.size)
     else:
-        pixel_area_m2 = abs(pixel_size_x * pixel_size_y)
-        pixel_area_km2 = pixel_area_m2 / 1_000_000
-    
+        counts = np.bincount(labels)
+        areas = counts * flat_pixel_area_km2(pixel_size_x, pixel_size_y)
+
     stats = {}
-    for label, count in zip(unique, counts):
-        if label == -1: continue 
-        area_km2 = count * pixel_area_km2
-        stats[int(label)] = round(float(area_km2), 4)
-        
+    for label in np.flatnonzero(counts):
+        stats[int(label)] = round(float(areas[label]), 4)
+
     return stats
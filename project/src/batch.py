@@ -0,0 +1,238 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import rasterio
+from . import processing, analysis
+from .summary import summarize_ndvi
+from .instrumentation import RECORDER, configure_json_log, stage
+
+# Rough peak bytes per pixel of the in-memory pipeline in process_scene:
+# float64 red, NIR and NDVI plus clustering temporaries and the class map
+PIPELINE_BYTES_PER_PIXEL = 48
+
+SUMMARY_FIELDS = ["scene", "class", "area_km2", "center", "ndvi_min", "ndvi_max", "ndvi_mean", "red", "nir"]
+
+def read_manifest(manifest_path):
+    # CSV with `red` and `nir` columns and an optional `name` column;
+    # relative paths are resolved against the manifest's directory.
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    scenes = []
+    with open(manifest_path, newline="") as f:
+        for row in csv.DictReader(f):
+            red = os.path.join(base_dir, row["red"])
+            nir = os.path.join(base_dir, row["nir"])
+            name = row.get("name") or scene_name(red, "red")
+            scenes.append({"name": name, "red": red, "nir": nir})
+    return scenes
+
+def scene_name(red_path, red_token):
+    stem = os.path.splitext(os.path.basename(red_path))[0]
+    return stem.replace(red_token, "").strip("_-. ") or stem
+
+def pairs_from_glob(pattern, red_token="red", nir_token="nir"):
+    scenes = []
+    for red in sorted(glob.glob(pattern)):
+        base = os.path.basename(red)
+        if red_token not in base:
+            continue
+        head, _, tail = base.rpartition(red_token)
+        nir = os.path.join(os.path.dirname(red), head + nir_token + tail)
+        if not os.path.exists(nir):
+            print(f"Skipping {red}: no matching NIR band {nir}")
+            continue
+        scenes.append({"name": scene_name(red, red_token), "red": red, "nir": nir})
+    return scenes
+
+def output_paths(output_dir, name):
+    return os.path.join(output_dir, f"{name}_ndvi.tif"), os.path.join(output_dir, f"{name}_stats.json")
+
+def run_params(n_clusters, engine, cog):
+    return {"clusters": n_clusters, "engine": engine, "cog": cog}
+
+def is_up_to_date(scene, output_dir, params):
+    # Outputs are reused only if they are newer than both inputs and were
+    # produced with the same run parameters (recorded in the sidecar)
+    ndvi_path, stats_path = output_paths(output_dir, scene["name"])
+    if not (os.path.exists(ndvi_path) and os.path.exists(stats_path)):
+        return False
+    newest_input = max(os.path.getmtime(scene["red"]), os.path.getmtime(scene["nir"]))
+    if min(os.path.getmtime(ndvi_path), os.path.getmtime(stats_path)) < newest_input:
+        return False
+    try:
+        with open(stats_path) as f:
+            return json.load(f).get("params") == params
+    except (OSError, ValueError):
+        return False
+
+def available_memory():
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def default_workers(scenes):
+    # Every worker holds a whole scene in memory, so the default is bounded
+    # by free memory for the largest scene, not only by the core count
+    workers = min(len(scenes), os.cpu_count() or 1)
+    available = available_memory()
+    if available is None:
+        return min(workers, 2)
+    largest = 0
+    for scene in scenes:
+        with rasterio.open(scene["red"]) as src:
+            largest = max(largest, src.width * src.height)
+    per_scene = max(1, largest * PIPELINE_BYTES_PER_PIXEL)
+    return max(1, min(workers, int(available * 0.8 // per_scene)))
+
+def process_scene(scene, output_dir, n_clusters=4, engine="kmeans", cog=None):
+    ndvi_path, stats_path = output_paths(output_dir, scene["name"])
+
+    name = scene["name"]
+    configure_json_log()
+    if processing.band_grids_match(scene["red"], scene["nir"]):
+        with stage("load_band", scene=name):
+            red_band, meta_red = processing.load_band(scene["red"])
+            nir_band, _ = processing.load_band(scene["nir"])
+        with stage("calculate_ndvi", scene=name):
+            ndvi_image = processing.calculate_ndvi(red_band, nir_band)
+        del red_band, nir_band
+    else:
+        # NIR on another grid is resampled onto the red grid block by block
+        with stage("align_and_calculate_ndvi", scene=name):
+            ndvi_image, meta_red = processing.calculate_ndvi_aligned(scene["red"], scene["nir"])
+
+    with stage("perform_kmeans_clustering", scene=name):
+        classified_map, centers = analysis.perform_kmeans_clustering(ndvi_image, n_clusters=n_clusters, engine=engine)
+    with stage("calculate_area_statistics", scene=name):
+        transform = meta_red["transform"]
+        pixel_area = analysis.pixel_area_from_meta(meta_red, classified_map.shape)
+        stats = analysis.calculate_area_statistics(classified_map, transform[0], transform[4], pixel_area=pixel_area)
+
+    # Write to temporary names first so an interrupted run is never
+    # mistaken for a finished scene on the next incremental pass.
+    tmp_ndvi = ndvi_path + ".part"
+    with stage("save_raster", scene=name):
+        if cog is not None:
+            processing.save_cog(ndvi_image, meta_red, tmp_ndvi, **cog)
+        else:
+            processing.save_raster(ndvi_image, meta_red.copy(), tmp_ndvi)
+    os.replace(tmp_ndvi, ndvi_path)
+
+    ndvi_summary = summarize_ndvi(ndvi_image)
+    has_data = ndvi_summary.count > 0
+    record = {
+        "scene": scene["name"],
+        "red": scene["red"],
+        "nir": scene["nir"],
+        "ndvi_min": ndvi_summary.min if has_data else None,
+        "ndvi_max": ndvi_summary.max if has_data else None,
+        "ndvi_mean": ndvi_summary.mean if has_data else None,
+        "centers": [float(c) for c in np.ravel(centers)],
+        "areas_km2": {str(k): v for k, v in stats.items()},
+        "params": run_params(n_clusters, engine, cog),
+        "stages": [
+            {k: v for k, v in r.items() if k != "scene"} for r in RECORDER.records(scene=name)
+        ],
+    }
+    tmp_stats = stats_path + ".part"
+    with open(tmp_stats, "w") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_stats, stats_path)
+    return record
+
+def summary_rows(record):
+    rows = []
+    for label, area in record["areas_km2"].items():
+        rows.append({
+            "scene": record["scene"],
+            "class": int(label),
+            "area_km2": area,
+            "center": record["centers"][int(label)],
+            "ndvi_min": record["ndvi_min"],
+            "ndvi_max": record["ndvi_max"],
+            "ndvi_mean": record["ndvi_mean"],
+            "red": record["red"],
+            "nir": record["nir"],
+        })
+    return rows
+
+def write_summary(records, summary_path):
+    rows = [row for record in records for row in summary_rows(record)]
+    if summary_path.endswith(".parquet"):
+        import pandas as pd
+        pd.DataFrame(rows, columns=SUMMARY_FIELDS).to_parquet(summary_path, index=False)
+        return
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def run_batch(scenes, output_dir, n_clusters=4, engine="kmeans", workers=None, force=False, summary="stats.csv", cog=None):
+    os.makedirs(output_dir, exist_ok=True)
+    params = run_params(n_clusters, engine, cog)
+    pending = [s for s in scenes if force or not is_up_to_date(s, output_dir, params)]
+    print(f"{len(scenes)} scenes, {len(scenes) - len(pending)} up to date, {len(pending)} to process")
+
+    failures = {}
+    if pending:
+        workers = workers or default_workers(pending)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(process_scene, scene, output_dir, n_clusters, engine, cog): scene["name"]
+                for scene in pending
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    print(f"Processed {name}")
+                except Exception as e:
+                    failures[name] = str(e)
+                    print(f"FAILED {name}: {e}")
+
+    # The summary is rebuilt from every scene's sidecar, including skipped ones
+    records = []
+    for scene in scenes:
+        _, stats_path = output_paths(output_dir, scene["name"])
+        if scene["name"] not in failures and os.path.exists(stats_path):
+            with open(stats_path) as f:
+                records.append(json.load(f))
+    summary_path = os.path.join(output_dir, summary)
+    write_summary(records, summary_path)
+    print(f"Summary written to {summary_path}")
+    return records, failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the NDVI pipeline over many red/NIR scene pairs.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="CSV file with red,nir[,name] columns")
+    source.add_argument("--glob", help="Glob matching red band files, e.g. 'scenes/*_red.tif'")
+    parser.add_argument("--red-token", default="red", help="Part of the red filename replaced to find the NIR band")
+    parser.add_argument("--nir-token", default="nir", help="Replacement used to build the NIR filename")
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--engine", choices=analysis.CLUSTERING_ENGINES, default="kmeans")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel scenes (default: cores, limited by free memory)")
+    parser.add_argument("--summary", default="stats.csv", help="Summary file name (.csv or .parquet)")
+    parser.add_argument("--force", action="store_true", help="Reprocess scenes even if outputs are up to date")
+    parser.add_argument("--cog", action="store_true", help="Write NDVI as a Cloud-optimized GeoTIFF")
+    parser.add_argument("--compress", choices=["deflate", "zstd"], default="deflate", help="COG compression")
+    parser.add_argument("--int16", action="store_true", help="Store COG NDVI as int16 scaled by 10000")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        scenes = read_manifest(args.manifest)
+    else:
+        scenes = pairs_from_glob(args.glob, args.red_token, args.nir_token)
+
+    cog = {"compress": args.compress, "scale_int16": args.int16} if args.cog else None
+    _, failures = run_batch(scenes, args.output_dir, args.clusters, args.engine, args.workers, args.force, args.summary, cog)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
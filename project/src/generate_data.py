@@ -1,56 +1,132 @@
-
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import rasterio
 from rasterio.transform import from_origin
+from rasterio.windows import Window
 import os
 
-def generate_sample_data(output_dir="data"):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+def make_features(width, height, n_features, rng):
+    # One centred circle reproduces the original sample scene; more features
+    # are scattered randomly with radii relative to the scene size. The radius
+    # range also shrinks with the feature count, keeping the vegetated
+    # fraction near a quarter instead of saturating the scene.
+    if n_features == 1:
+        return np.array([[width // 2, height // 2, min(width, height) // 5]])
+    size = min(width, height)
+    r_max = max(3, min(size // 15, int(np.sqrt(width * height / (4 * n_features)))))
+    r_min = max(2, min(size // 100, r_max // 4))
+    cx = rng.integers(0, width, n_features)
+    cy = rng.integers(0, height, n_features)
+    r = rng.integers(r_min, r_max, n_features)
+    return np.stack([cx, cy, r], axis=1)
 
-    # Define image properties
-    width, height = 500, 500
-    transform = from_origin(75.0, 31.0, 0.0001, 0.0001)  # Approx 10m scale
-    crs = {'init': 'epsg:4326'}
+def generation_windows(width, height, blocksize, tiled):
+    if tiled:
+        for row in range(0, height, blocksize):
+            for col in range(0, width, blocksize):
+                yield Window(col, row, min(blocksize, width - col), min(blocksize, height - row))
+    else:
+        for row in range(0, height, blocksize):
+            yield Window(0, row, width, min(blocksize, height - row))
+
+def render_window(window, features, seed):
+    rng = np.random.default_rng(seed)
+    col_off, row_off = int(window.col_off), int(window.row_off)
+    w, h = int(window.width), int(window.height)
 
     # Generate synthetic Red Band (Band 4)
     # Background (Soil/Urban) = High Red
-    # Vegetation = Low Red
-    red_band = np.random.randint(500, 1500, (height, width)).astype(np.float32)
-    # Add a "vegetation" circle feature
-    y, x = np.ogrid[:height, :width]
-    mask = (x - 250)**2 + (y - 250)**2 < 100**2
-    red_band[mask] = np.random.randint(200, 600, mask.sum()) # Vegetation absorbs Red
-
+    red_band = rng.integers(500, 1500, (h, w), dtype=np.uint16).astype(np.float32)
     # Generate synthetic NIR Band (Band 8)
     # Background (Soil/Urban) = Moderate NIR
-    # Vegetation = High NIR
-    nir_band = np.random.randint(600, 1600, (height, width)).astype(np.float32)
-    nir_band[mask] = np.random.randint(2000, 4000, mask.sum()) # Vegetation reflects NIR
+    nir_band = rng.integers(600, 1600, (h, w), dtype=np.uint16).astype(np.float32)
 
-    # Save Red Band
-    red_path = os.path.join(output_dir, "sample_red.tif")
-    with rasterio.open(
-        red_path, 'w', driver='GTiff',
-        height=height, width=width,
+    # Only the features whose bounding box touches this window are rasterized,
+    # and each one only over its own bounding box.
+    cx, cy, r = features[:, 0], features[:, 1], features[:, 2]
+    hits = (cx + r > col_off) & (cx - r < col_off + w) & (cy + r > row_off) & (cy - r < row_off + h)
+    mask = np.zeros((h, w), dtype=bool)
+    for fx, fy, fr in features[hits]:
+        r0, r1 = max(fy - fr - row_off, 0), min(fy + fr - row_off + 1, h)
+        c0, c1 = max(fx - fr - col_off, 0), min(fx + fr - col_off + 1, w)
+        y, x = np.ogrid[r0 + row_off:r1 + row_off, c0 + col_off:c1 + col_off]
+        mask[r0:r1, c0:c1] |= (x - fx)**2 + (y - fy)**2 < fr**2
+
+    count = int(mask.sum())
+    red_band[mask] = rng.integers(200, 600, count) # Vegetation absorbs Red
+    nir_band[mask] = rng.integers(2000, 4000, count) # Vegetation reflects NIR
+    return window, red_band, nir_band
+
+def generate_sample_data(output_dir="data", width=500, height=500, n_features=1, seed=None,
+                         tiled=False, blocksize=256, compress=None, bigtiff=None, workers=1):
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # Define image properties
+    transform = from_origin(75.0, 31.0, 0.0001, 0.0001)  # Approx 10m scale
+    crs = {'init': 'epsg:4326'}
+
+    profile = dict(
+        driver='GTiff', height=height, width=width,
         count=1, dtype=rasterio.float32,
         crs=crs, transform=transform
-    ) as dst:
-        dst.write(red_band, 1)
+    )
+    if tiled:
+        profile.update(tiled=True, blockxsize=blocksize, blockysize=blocksize)
+    if compress:
+        profile.update(compress=compress, predictor=3, num_threads='ALL_CPUS')
+    if bigtiff is not None:
+        profile.update(bigtiff='YES' if bigtiff else 'NO')
+
+    seed_sequence = np.random.SeedSequence(seed)
+    features = make_features(width, height, n_features, np.random.default_rng(seed_sequence.spawn(1)[0]))
+    windows = list(generation_windows(width, height, blocksize, tiled))
+    # Every window gets its own child seed, so output is reproducible for a
+    # given seed no matter how many workers generate it.
+    window_seeds = seed_sequence.spawn(len(windows))
 
-    # Save NIR Band
+    red_path = os.path.join(output_dir, "sample_red.tif")
     nir_path = os.path.join(output_dir, "sample_nir.tif")
-    with rasterio.open(
-        nir_path, 'w', driver='GTiff',
-        height=height, width=width,
-        count=1, dtype=rasterio.float32,
-        crs=crs, transform=transform
-    ) as dst:
-        dst.write(nir_band, 1)
+
+    with rasterio.open(red_path, 'w', **profile) as red_dst, rasterio.open(nir_path, 'w', **profile) as nir_dst:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            pending = deque()
+            for window, window_seed in zip(windows, window_seeds):
+                pending.append(executor.submit(render_window, window, features, window_seed))
+                if len(pending) >= max(1, workers) * 2:
+                    write_window(red_dst, nir_dst, *pending.popleft().result())
+            while pending:
+                write_window(red_dst, nir_dst, *pending.popleft().result())
 
     print(f"Generated sample files in {output_dir}:")
     print(f"- {red_path}")
     print(f"- {nir_path}")
+    return red_path, nir_path
+
+def write_window(red_dst, nir_dst, window, red_band, nir_band):
+    red_dst.write(red_band, 1, window=window)
+    nir_dst.write(nir_band, 1, window=window)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic red/NIR GeoTIFF pair.")
+    parser.add_argument("--output-dir", default="data")
+    parser.add_argument("--width", type=int, default=500)
+    parser.add_argument("--height", type=int, default=500)
+    parser.add_argument("--features", type=int, default=1, help="Number of vegetation features")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--tiled", action="store_true")
+    parser.add_argument("--blocksize", type=int, default=256)
+    parser.add_argument("--compress", choices=["deflate", "zstd", "lzw"], default=None)
+    parser.add_argument("--bigtiff", action="store_true")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    generate_sample_data(
+        args.output_dir, args.width, args.height, args.features, args.seed,
+        args.tiled, args.blocksize, args.compress, args.bigtiff or None, args.workers
+    )
 
 if __name__ == "__main__":
-    generate_sample_data()
+    main()
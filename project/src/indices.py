@@ -0,0 +1,147 @@
+import argparse
+from contextlib import ExitStack
+import numpy as np
+import rasterio
+from . import processing
+
+# Band numbers in a 12-band Sentinel-2 L2A stack ordered
+# B1, B2, B3, B4, B5, B6, B7, B8, B8A, B9, B11, B12
+SENTINEL2_L2A_BANDS = {'blue': 2, 'green': 3, 'red': 4, 'nir': 8, 'swir1': 11, 'swir2': 12}
+
+INDICES = {}
+
+def register_index(name, bands):
+    def decorator(func):
+        INDICES[name] = (tuple(bands), func)
+        return func
+    return decorator
+
+class BandTerms:
+    # Lazily computed, memoised band arithmetic for one block. Indices ask
+    # for the terms they need, so e.g. NDVI, SAVI and EVI share nir - red.
+
+    def __init__(self, bands, scale=1.0):
+        self.bands = bands
+        self.scale = scale
+        self._cache = {}
+
+    def __getitem__(self, name):
+        return self.bands[name]
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def difference(self, a, b):
+        return self._memo(('-', a, b), lambda: self.bands[a] - self.bands[b])
+
+    def sum(self, a, b):
+        a, b = sorted((a, b))
+        return self._memo(('+', a, b), lambda: self.bands[a] + self.bands[b])
+
+    def normalized_difference(self, a, b):
+        # Same arithmetic as processing.calculate_ndvi, so NDVI is identical
+        def compute():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                nd = self.difference(a, b) / self.sum(a, b)
+            nd = np.nan_to_num(nd, nan=np.nan, posinf=1.0, neginf=-1.0)
+            return np.clip(nd, -1.0, 1.0)
+        return self._memo(('nd', a, b), compute)
+
+@register_index("ndvi", ["red", "nir"])
+def ndvi(terms):
+    return terms.normalized_difference("nir", "red")
+
+@register_index("ndwi", ["green", "nir"])
+def ndwi(terms):
+    return terms.normalized_difference("green", "nir")
+
+@register_index("ndmi", ["nir", "swir1"])
+def ndmi(terms):
+    return terms.normalized_difference("nir", "swir1")
+
+@register_index("savi", ["red", "nir"])
+def savi(terms, soil_factor=0.5):
+    # The additive constants are defined on reflectance; dividing them by the
+    # band scale lets SAVI and EVI reuse the raw-count nir - red and nir + red.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (1 + soil_factor) * terms.difference("nir", "red") / (terms.sum("nir", "red") + soil_factor / terms.scale)
+
+@register_index("evi", ["blue", "red", "nir"])
+def evi(terms):
+    denominator = terms["nir"] + 6 * terms["red"] - 7.5 * terms["blue"] + 1 / terms.scale
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 2.5 * terms.difference("nir", "red") / denominator
+
+def separate_band_sources(**band_paths):
+    return {band: (path, 1) for band, path in band_paths.items() if path}
+
+def stack_band_sources(stack_path, band_map=SENTINEL2_L2A_BANDS):
+    return {band: (stack_path, bidx) for band, bidx in band_map.items()}
+
+def compute_indices(sources, names, output_path, block_size=512, scale=1.0):
+    # sources maps band name -> (path, band number). Each block of every
+    # required band is read once and all requested indices are evaluated from
+    # it, written as one band each of a single multi-band GeoTIFF.
+    unknown = [n for n in names if n not in INDICES]
+    if unknown:
+        raise ValueError(f"Unknown indices {unknown}, available: {sorted(INDICES)}")
+    needed = sorted({band for n in names for band in INDICES[n][0]})
+    missing = [band for band in needed if band not in sources]
+    if missing:
+        raise ValueError(f"Indices {names} need bands {missing} which were not provided")
+
+    # Group bands by file so a multi-band stack is read with one call per block
+    by_path = {}
+    for band in needed:
+        path, bidx = sources[band]
+        by_path.setdefault(path, []).append((band, bidx))
+
+    with ExitStack() as stack:
+        datasets = {path: stack.enter_context(rasterio.open(path)) for path in by_path}
+        reference = datasets[sources[needed[0]][0]]
+        for src in datasets.values():
+            if not processing.grids_match(src, reference):
+                raise ValueError(f"Band grids differ (shape, CRS or transform): {src.name} vs {reference.name}")
+
+        meta = reference.meta.copy()
+        # NaN is the missing marker; an inherited nodata of 0 would mask
+        # genuine zero index values (e.g. NDVI or NDWI of 0)
+        meta.update(dtype=rasterio.float32, count=len(names), nodata=np.nan)
+        dst = stack.enter_context(rasterio.open(output_path, 'w', **meta))
+        for i, name in enumerate(names, start=1):
+            dst.set_band_description(i, name)
+
+        for window in processing.block_windows(reference, block_size):
+            bands = {}
+            for path, band_list in by_path.items():
+                data = datasets[path].read([bidx for _, bidx in band_list], window=window).astype(float)
+                for (band, _), values in zip(band_list, data):
+                    bands[band] = values
+            terms = BandTerms(bands, scale)
+            for i, name in enumerate(names, start=1):
+                dst.write(INDICES[name][1](terms).astype(rasterio.float32), i, window=window)
+
+    return output_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute several spectral indices in one pass over the bands.")
+    parser.add_argument("--indices", nargs="+", default=["ndvi"], choices=sorted(INDICES))
+    parser.add_argument("--stack", help="Multi-band file in Sentinel-2 L2A band order")
+    for band in ("blue", "green", "red", "nir", "swir1"):
+        parser.add_argument(f"--{band}", help=f"Single-band file for {band}")
+    parser.add_argument("--scale", type=float, default=1.0, help="Factor converting band values to reflectance, e.g. 0.0001")
+    parser.add_argument("--block-size", type=int, default=512)
+    parser.add_argument("--output", default="indices.tif")
+    args = parser.parse_args(argv)
+
+    sources = stack_band_sources(args.stack) if args.stack else {}
+    sources.update(separate_band_sources(
+        blue=args.blue, green=args.green, red=args.red, nir=args.nir, swir1=args.swir1
+    ))
+    compute_indices(sources, args.indices, args.output, args.block_size, args.scale)
+    print(f"Wrote {', '.join(args.indices)} to {args.output}")
+
+if __name__ == "__main__":
+    main()
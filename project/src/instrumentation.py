@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("ndvi.stages")
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss_mb():
+    # Resident set size right now. Only available on Linux; None elsewhere.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+class PeakRSS:
+    # Samples the current RSS on a background thread while the block runs.
+    # Unlike ru_maxrss, which is the process-lifetime high-water mark, this
+    # gives the peak of this block alone (and `growth` above its start).
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def begin(self):
+        self.start = self.peak = current_rss_mb()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def end(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._sample()
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+    @property
+    def growth(self):
+        return None if self.start is None else self.peak - self.start
+
+def io_bytes():
+    # Bytes read and written by the process (including page-cache hits).
+    # Only available on Linux; elsewhere the I/O fields stay at zero.
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+class StageRecorder:
+    # Keeps the most recent stage records in memory and logs each one as a
+    # JSON line. CPU time, RSS and I/O are process-wide, so stages running
+    # concurrently in other threads are included in each other's numbers.
+
+    def __init__(self, max_records=2000):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        record = {"stage": name, **fields}
+        read_start, write_start = io_bytes()
+        rss = PeakRSS().begin()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        status = "ok"
+        try:
+            yield record
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            wall_s = time.perf_counter() - wall_start
+            cpu_s = time.process_time() - cpu_start
+            rss.end()
+            read_end, write_end = io_bytes()
+            record.update(
+                status=status,
+                started=time.time() - wall_s,
+                wall_s=round(wall_s, 6),
+                cpu_s=round(cpu_s, 6),
+                rss_start_mb=None if rss.start is None else round(rss.start, 1),
+                peak_rss_mb=None if rss.peak is None else round(rss.peak, 1),
+                rss_growth_mb=None if rss.growth is None else round(rss.growth, 1),
+                bytes_read=read_end - read_start,
+                bytes_written=write_end - write_start,
+            )
+            with self._lock:
+                self._records.append(record)
+            logger.info(json.dumps(record, default=str))
+
+    def records(self, **filters):
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if all(r.get(k) == v for k, v in filters.items())]
+
+    def to_json(self, **filters):
+        return json.dumps(self.records(**filters), indent=2, default=str)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+RECORDER = StageRecorder()
+
+def stage(name, **fields):
+    return RECORDER.stage(name, **fields)
+
+def configure_json_log(path=None):
+    # Appends one JSON object per stage to `path`, or to the file named by
+    # the NDVI_STAGE_LOG environment variable.
+    path = path or os.environ.get("NDVI_STAGE_LOG")
+    if not path or any(getattr(h, "baseFilename", None) == os.path.abspath(path) for h in logger.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.stage = "Waiting for a free worker"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def report(self, stage, progress):
+        self.stage = stage
+        self.progress = min(max(progress, 0.0), 1.0)
+
+class JobManager:
+    # Runs analysis jobs on a small thread pool, off the Streamlit script
+    # thread. Jobs are keyed by their inputs, so a rerun, a second tab or
+    # another user asking for the same result attaches to the existing job
+    # instead of starting a new one. Only the newest finished jobs are kept.
+
+    def __init__(self, max_workers=2, max_finished=32, spool_dir=None):
+        self.max_finished = max_finished
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="ndvi_spool_")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, key):
+        # Failed jobs are returned too, so callers can show their error
+        with self._lock:
+            return self._jobs.get(self._by_key.get(key))
+
+    def submit(self, key, func, *args, replace=False):
+        # func is called as func(report, *args), where report(stage, fraction)
+        # updates the job's progress. An existing job for the key is returned
+        # instead, unless it has finished and `replace` asks for a fresh run
+        # (e.g. an explicit retry after a failure).
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing is not None and not (replace and existing.done):
+                return existing
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self._prune()
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def spool(self, uploaded_file, suffix=".tif"):
+        # Stream the upload to disk in chunks rather than materialising
+        # another full copy of it with getvalue().
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.spool_dir)
+        uploaded_file.seek(0)
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, 1024 * 1024)
+        return path
+
+    def _run(self, job, func, args):
+        job.status = "running"
+        try:
+            job.result = func(job.report, *args)
+            job.report("Complete", 1.0)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
@@ -1,12 +1,98 @@
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import rasterio
+import rasterio.shutil
+from rasterio.enums import Interleaving, Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
 
-def load_band(file_path):
+# Target pixel count when coalescing thin strips into one streaming block
+STRIP_BLOCK_PIXELS = 1024 * 1024
+
+# Scaled int16 NDVI storage: value = round(ndvi * 10000), NaN -> nodata
+NDVI_INT16_SCALE = 10000
+NDVI_INT16_NODATA = -32768
+
+def load_band(file_path, dtype=float):
     with rasterio.open(file_path) as src:
-        band = src.read(1).astype(float)
+        band = src.read(1)
+        if dtype is not None:
+            band = band.astype(dtype)
         meta = src.meta
     return band, meta
 
+def band_meta(src, bidx=1):
+    meta = src.meta.copy()
+    meta.update(
+        nodata=src.nodatavals[bidx - 1],
+        mask_flags=[flag.name for flag in src.mask_flag_enums[bidx - 1]],
+        block_shape=src.block_shapes[bidx - 1],
+        compression=src.compression.value if src.compression else None,
+    )
+    return meta
+
+def block_offset(src, row, col, bidx=1):
+    offset = src.get_tag_item(f'BLOCK_OFFSET_{col}_{row}', 'TIFF', bidx=bidx)
+    return None if offset is None else int(offset)
+
+def mmap_band(src, file_path, bidx=1):
+    # An uncompressed, striped GeoTIFF normally stores each band as one
+    # contiguous run of bytes, which can be mapped instead of decoded.
+    if src.driver != 'GTiff' or src.compression is not None:
+        return None
+    if src.count > 1 and src.interleaving != Interleaving.band:
+        return None
+    block_h, block_w = src.block_shapes[bidx - 1]
+    if block_w != src.width:
+        return None
+
+    strip_bytes = block_h * src.width * np.dtype(src.dtypes[bidx - 1]).itemsize
+    first = block_offset(src, 0, 0, bidx)
+    if first is None:
+        return None
+    for row in range(1, -(-src.height // block_h)):
+        if block_offset(src, row, 0, bidx) != first + row * strip_bytes:
+            return None
+
+    with open(file_path, 'rb') as f:
+        byte_order = '<' if f.read(2) == b'II' else '>'
+    dtype = np.dtype(src.dtypes[bidx - 1]).newbyteorder(byte_order)
+    return np.memmap(file_path, dtype=dtype, mode='r', offset=first, shape=(src.height, src.width))
+
+def open_band(file_path, bidx=1, window=None, overview_level=None, mmap=True):
+    # Native-dtype counterpart of load_band: returns a read-only memory map
+    # when the layout allows it, otherwise reads only the requested window
+    # (optionally from an overview level).
+    open_kwargs = {} if overview_level is None else {'overview_level': overview_level}
+    with rasterio.open(file_path, **open_kwargs) as src:
+        meta = band_meta(src, bidx)
+        band = mmap_band(src, file_path, bidx) if mmap and overview_level is None else None
+        if band is None:
+            band = src.read(bidx, window=window)
+        elif window is not None:
+            band = band[window.toslices()]
+        if window is not None:
+            meta.update(width=band.shape[1], height=band.shape[0], transform=src.window_transform(window))
+    return band, meta
+
+def is_empty_window(src, window, bidx=1):
+    # Sparse GeoTIFF blocks have no data on disk and read back as nodata (or 0),
+    # so a window covered only by sparse blocks can be skipped without reading.
+    if src.driver != 'GTiff' or src.nodatavals[bidx - 1] not in (None, 0):
+        return False
+    block_h, block_w = src.block_shapes[bidx - 1]
+    first_row, last_row = int(window.row_off) // block_h, int(window.row_off + window.height - 1) // block_h
+    first_col, last_col = int(window.col_off) // block_w, int(window.col_off + window.width - 1) // block_w
+    for row in range(first_row, last_row + 1):
+        for col in range(first_col, last_col + 1):
+            if block_offset(src, row, col, bidx) is not None:
+                return False
+    return True
+
 def calculate_ndvi(red_band, nir_band):
     np.seterr(divide='ignore', invalid='ignore')
     numerator = nir_band - red_band
@@ -16,7 +102,241 @@ def calculate_ndvi(red_band, nir_band):
     ndvi = np.clip(ndvi, -1.0, 1.0)
     return ndvi
 
-def save_raster(data, meta, output_path):
+def calculate_ndvi_float32(red_band, nir_band, out=None, scratch=None):
+    # Works on the native band dtype (e.g. uint16) and only writes into `out`
+    # and `scratch`, so callers can reuse both buffers across tiles. Clipping
+    # maps +/-inf from zero denominators to +/-1 and leaves 0/0 as NaN, which
+    # matches calculate_ndvi without the nan_to_num pass.
+    if out is None:
+        out = np.empty(red_band.shape, dtype=np.float32)
+    if scratch is None:
+        scratch = np.empty(red_band.shape, dtype=np.float32)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.add(nir_band, red_band, out=scratch, dtype=np.float32)
+        np.subtract(nir_band, red_band, out=out, dtype=np.float32)
+        np.divide(out, scratch, out=out)
+    np.clip(out, -1.0, 1.0, out=out)
+    return out
+
+def block_windows(src, block_size=None):
+    if block_size:
+        for row in range(0, src.height, block_size):
+            for col in range(0, src.width, block_size):
+                yield Window(col, row, min(block_size, src.width - col), min(block_size, src.height - row))
+        return
+
+    block_h, block_w = src.block_shapes[0]
+    if block_w < src.width:
+        for _, window in src.block_windows(1):
+            yield window
+        return
+
+    # Striped files usually have a handful of rows per strip; group whole
+    # strips so each read is large enough to be worth the call overhead.
+    rows = max(block_h, (STRIP_BLOCK_PIXELS // src.width) // block_h * block_h)
+    for row in range(0, src.height, rows):
+        yield Window(0, row, src.width, min(rows, src.height - row))
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def grids_match(src, reference):
+    return (
+        src.shape == reference.shape
+        and src.crs == reference.crs
+        and src.transform.almost_equals(reference.transform)
+    )
+
+def band_grids_match(red_path, nir_path):
+    with rasterio.open(red_path) as red_src, rasterio.open(nir_path) as nir_src:
+        return grids_match(nir_src, red_src)
+
+def align_to(src, reference, resampling=Resampling.bilinear):
+    # Returns src unchanged when it is already on the reference grid, otherwise
+    # a WarpedVRT that resamples only the windows actually read. It is float32
+    # with NaN nodata, so pixels outside src's footprint (or nodata in src)
+    # come back as NaN rather than as a fake 0 reflectance.
+    if grids_match(src, reference):
+        return src
+    if src.crs is None or reference.crs is None:
+        raise ValueError(
+            f"Band grids differ ({src.shape} vs {reference.shape}) and cannot be aligned without a CRS"
+        )
+    return WarpedVRT(
+        src, crs=reference.crs, transform=reference.transform,
+        width=reference.width, height=reference.height,
+        resampling=resampling, dtype='float32', nodata=np.nan,
+    )
+
+@contextmanager
+def open_band_pair(red_path, nir_path, resampling=Resampling.bilinear):
+    # Yields (red, nir) datasets with NIR on the red band's grid. Handles are
+    # closed explicitly rather than used as context managers, which would tie
+    # them to the opening thread's GDAL environment.
+    with ExitStack() as stack:
+        red_src = rasterio.open(red_path)
+        stack.callback(red_src.close)
+        nir_src = rasterio.open(nir_path)
+        stack.callback(nir_src.close)
+        aligned = align_to(nir_src, red_src, resampling)
+        if aligned is not nir_src:
+            stack.callback(aligned.close)
+        yield red_src, aligned
+
+def read_ndvi_block(red_src, nir_src, window):
+    if is_empty_window(red_src, window) and is_empty_window(nir_src, window):
+        # Both inputs are all zeros here, which calculate_ndvi turns into NaN
+        return np.full((int(window.height), int(window.width)), np.nan)
+    red_block = red_src.read(1, window=window).astype(float)
+    nir_block = nir_src.read(1, window=window).astype(float)
+    return calculate_ndvi(red_block, nir_block)
+
+def iter_ndvi_blocks(red_path, nir_path, block_size=None, workers=1):
+    # Blocks follow the red band's grid; a NIR band on a different grid is
+    # resampled window by window as it is read (see align_to).
+    with open_band_pair(red_path, nir_path) as (red_src, nir_src):
+        windows = list(block_windows(red_src, block_size))
+        if workers <= 1:
+            for window in windows:
+                yield window, read_ndvi_block(red_src, nir_src, window)
+            return
+
+    # Dataset handles are not thread-safe, so every worker opens its own pair.
+    # GDAL releases the GIL while decoding, which lets reads overlap.
+    local = threading.local()
+    handles = ExitStack()
+    handles_lock = threading.Lock()
+
+    def work(window):
+        if not hasattr(local, "sources"):
+            with handles_lock:
+                local.sources = handles.enter_context(open_band_pair(red_path, nir_path))
+        return window, read_ndvi_block(*local.sources, window)
+
+    # Keep a bounded number of tiles in flight so memory stays proportional
+    # to workers x block size rather than to the scene.
+    in_flight = workers * 2
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for window in windows:
+                pending.append(executor.submit(work, window))
+                if len(pending) >= in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        handles.close()
+
+def calculate_ndvi_aligned(red_path, nir_path, block_size=None, workers=1, dtype=float):
+    # In-memory NDVI on the red band's grid, assembled block by block so a
+    # NIR band on another grid is never resampled as a whole.
+    with rasterio.open(red_path) as src:
+        meta = src.meta.copy()
+    ndvi = np.empty((meta['height'], meta['width']), dtype=dtype)
+    for window, ndvi_block in iter_ndvi_blocks(red_path, nir_path, block_size, workers):
+        ndvi[window.toslices()] = ndvi_block
+    return ndvi, meta
+
+def calculate_ndvi_windowed(red_path, nir_path, output_path, block_size=None, workers=1, accumulator=None, cog=None):
+    # `cog` is None for a plain GeoTIFF, or a dict of open_cog options
+    # (an empty dict uses the defaults) to write a Cloud-optimized GeoTIFF.
+    with rasterio.open(red_path) as src:
+        meta = src.meta.copy()
+    if cog is not None:
+        block_size = block_size or cog.get('blocksize', 512)
+        with open_cog(meta, output_path, **cog) as write:
+            for window, ndvi_block in iter_ndvi_blocks(red_path, nir_path, block_size, workers):
+                write(ndvi_block, window)
+                if accumulator is not None:
+                    accumulator.update(ndvi_block)
+        return output_path
+
+    with open_raster(meta, output_path) as dst:
+        for window, ndvi_block in iter_ndvi_blocks(red_path, nir_path, block_size, workers):
+            save_raster(ndvi_block, meta, output_path, window=window, dst=dst)
+            if accumulator is not None:
+                accumulator.update(ndvi_block)
+    return output_path
+
+def calculate_ndvi_parallel(red_path, nir_path, output_path, workers=None, block_size=512, accumulator=None, cog=None):
+    workers = workers or default_workers()
+    return calculate_ndvi_windowed(red_path, nir_path, output_path, block_size, workers, accumulator, cog)
+
+def open_raster(meta, output_path):
     meta.update(dtype=rasterio.float32, count=1)
-    with rasterio.open(output_path, 'w', **meta) as dst:
-        dst.write(data.astype(rasterio.float32), 1)
+    return rasterio.open(output_path, 'w', **meta)
+
+def save_raster(data, meta, output_path, window=None, dst=None):
+    if dst is not None:
+        dst.write(data.astype(rasterio.float32), 1, window=window)
+        return
+    with open_raster(meta, output_path) as dst:
+        dst.write(data.astype(rasterio.float32), 1, window=window)
+
+def encode_ndvi_int16(data):
+    scaled = np.round(np.asarray(data, dtype=np.float32) * NDVI_INT16_SCALE)
+    return np.where(np.isnan(scaled), NDVI_INT16_NODATA, scaled).astype(np.int16)
+
+def decode_ndvi(band, meta):
+    if np.dtype(meta['dtype']) != np.int16:
+        return band.astype(np.float32, copy=False)
+    ndvi = band.astype(np.float32) / NDVI_INT16_SCALE
+    ndvi[band == NDVI_INT16_NODATA] = np.nan
+    return ndvi
+
+@contextmanager
+def open_cog(meta, output_path, blocksize=512, compress='deflate', scale_int16=False, overview_levels=None):
+    # Blocks are written by window into a tiled, compressed intermediate file,
+    # overviews are built on it, and GDAL's COG driver then lays it out as a
+    # Cloud-optimized GeoTIFF reusing those overviews. Yields write(block, window).
+    profile = meta.copy()
+    profile.update(
+        driver='GTiff', count=1, tiled=True, blockxsize=blocksize, blockysize=blocksize,
+        compress=compress, bigtiff='IF_SAFER', num_threads='ALL_CPUS',
+    )
+    if scale_int16:
+        profile.update(dtype=rasterio.int16, nodata=NDVI_INT16_NODATA, predictor=2)
+        encode = encode_ndvi_int16
+    else:
+        # NaN must be declared as nodata, or averaged overviews spread it
+        profile.update(dtype=rasterio.float32, nodata=np.nan, predictor=3)
+        encode = lambda block: block.astype(rasterio.float32)
+
+    if overview_levels is None:
+        overview_levels = []
+        factor = 2
+        while max(meta['width'], meta['height']) / factor >= blocksize:
+            overview_levels.append(factor)
+            factor *= 2
+
+    tmp_path = output_path + '.tmp.tif'
+    try:
+        with rasterio.open(tmp_path, 'w', **profile) as dst:
+            if scale_int16:
+                dst.scales = (1 / NDVI_INT16_SCALE,)
+                dst.offsets = (0.0,)
+            yield lambda block, window: dst.write(encode(block), 1, window=window)
+            if overview_levels:
+                # Averaging skips the declared nodata (NaN or the int16 sentinel)
+                dst.build_overviews(overview_levels, Resampling.average)
+
+        rasterio.shutil.copy(
+            tmp_path, output_path, driver='COG', compress=compress,
+            predictor='STANDARD' if scale_int16 else 'FLOATING_POINT',
+            blocksize=blocksize, overviews='FORCE_USE_EXISTING' if overview_levels else 'NONE',
+            bigtiff='IF_SAFER', num_threads='ALL_CPUS',
+        )
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def save_cog(data, meta, output_path, blocksize=512, compress='deflate', scale_int16=False, overview_levels=None):
+    height, width = data.shape
+    with open_cog(meta, output_path, blocksize, compress, scale_int16, overview_levels) as write:
+        for row in range(0, height, blocksize):
+            for col in range(0, width, blocksize):
+                window = Window(col, row, min(blocksize, width - col), min(blocksize, height - row))
+                write(data[row:row + blocksize, col:col + blocksize], window)
+    return output_path
+
@@ -0,0 +1,61 @@
+import numpy as np
+
+class NDVIAccumulator:
+    # One-pass NDVI statistics: fed block by block, it keeps a fixed-bin
+    # histogram plus exact count, sum, min and max, so nothing scales with the
+    # scene size. Percentiles are interpolated from the histogram.
+
+    def __init__(self, n_bins=200, value_range=(-1.0, 1.0)):
+        self.edges = np.linspace(value_range[0], value_range[1], n_bins + 1)
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, block):
+        values = block[~np.isnan(block)]
+        if values.size == 0:
+            return self
+        counts, _ = np.histogram(values, bins=self.edges.size - 1, range=(self.edges[0], self.edges[-1]))
+        self.counts += counts
+        self.count += values.size
+        self.total += float(values.sum(dtype=np.float64))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    @property
+    def bin_centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    def percentile(self, q):
+        if not self.count:
+            return np.nan
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)])
+        value = float(np.interp(q / 100 * self.count, cumulative, self.edges))
+        return min(max(value, self.min), self.max)
+
+    def as_dict(self, percentiles=(5, 25, 50, 75, 95)):
+        summary = {"count": self.count, "min": self.min, "max": self.max, "mean": self.mean}
+        for q in percentiles:
+            summary[f"p{q}"] = self.percentile(q)
+        return summary
+
+def summarize_ndvi(ndvi_data, n_bins=200, block_rows=1024):
+    accumulator = NDVIAccumulator(n_bins)
+    for row in range(0, ndvi_data.shape[0], block_rows):
+        accumulator.update(ndvi_data[row:row + block_rows])
+    return accumulator
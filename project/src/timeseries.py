@@ -0,0 +1,113 @@
+import argparse
+import csv
+import os
+import warnings
+from contextlib import ExitStack
+from datetime import date
+import numpy as np
+import rasterio
+from . import processing
+
+AGGREGATES = ("max", "max_index", "mean", "slope", "change")
+
+def temporal_aggregates(ndvi_stack, times, baseline=0):
+    # ndvi_stack has shape (time, rows, cols); NaN marks missing observations
+    # (clouds, nodata) and is ignored by every aggregate.
+    valid = ~np.isnan(ndvi_stack)
+    n_valid = valid.sum(axis=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        ndvi_max = np.nanmax(ndvi_stack, axis=0)
+        ndvi_mean = np.nanmean(ndvi_stack, axis=0)
+
+        # Per-pixel least-squares trend over the valid observations only
+        t = np.broadcast_to(np.asarray(times, dtype=float).reshape(-1, 1, 1), ndvi_stack.shape)
+        t_mean = np.where(valid, t, 0).sum(axis=0) / n_valid
+        t_dev = np.where(valid, t - t_mean, 0)
+        covariance = np.where(valid, t_dev * (ndvi_stack - ndvi_mean), 0).sum(axis=0)
+        variance = (t_dev ** 2).sum(axis=0)
+        slope = np.where((n_valid >= 2) & (variance > 0), covariance / variance, np.nan)
+
+    max_index = np.where(n_valid > 0, np.argmax(np.where(valid, ndvi_stack, -np.inf), axis=0), -1)
+    change = ndvi_stack[-1] - ndvi_stack[baseline]
+
+    return {
+        "max": ndvi_max,
+        "max_index": max_index,
+        "mean": ndvi_mean,
+        "slope": slope,
+        "change": change,
+    }
+
+def process_stack(scenes, output_dir, times=None, baseline=0, block_size=512, prefix="ndvi"):
+    # scenes is an ordered list of co-registered (red_path, nir_path) pairs.
+    # Only one block of every scene is held in memory at a time.
+    if len(scenes) < 2:
+        raise ValueError("A time series needs at least two scenes")
+    times = np.arange(len(scenes)) if times is None else np.asarray(times, dtype=float)
+    os.makedirs(output_dir, exist_ok=True)
+    output_paths = {name: os.path.join(output_dir, f"{prefix}_{name}.tif") for name in AGGREGATES}
+
+    with ExitStack() as stack:
+        sources = [
+            (stack.enter_context(rasterio.open(red)), stack.enter_context(rasterio.open(nir)))
+            for red, nir in scenes
+        ]
+        reference = sources[0][0]
+        for red_src, nir_src in sources:
+            for src in (red_src, nir_src):
+                if not processing.grids_match(src, reference):
+                    raise ValueError(f"Scenes are not co-registered (shape, CRS or transform): {src.name} vs {reference.name}")
+
+        outputs = {}
+        for name, path in output_paths.items():
+            meta = reference.meta.copy()
+            if name == "max_index":
+                meta.update(dtype=rasterio.int16, count=1, nodata=-1)
+                outputs[name] = stack.enter_context(rasterio.open(path, 'w', **meta))
+            else:
+                # NaN marks missing observations; an inherited nodata of 0
+                # would mask genuine zero change or a flat trend
+                meta.update(nodata=np.nan)
+                outputs[name] = stack.enter_context(processing.open_raster(meta, path))
+
+        for window in processing.block_windows(reference, block_size):
+            ndvi_stack = np.stack([
+                processing.read_ndvi_block(red_src, nir_src, window) for red_src, nir_src in sources
+            ])
+            for name, block in temporal_aggregates(ndvi_stack, times, baseline).items():
+                outputs[name].write(block.astype(outputs[name].dtypes[0]), 1, window=window)
+
+    return output_paths
+
+def read_stack_manifest(manifest_path):
+    # CSV with red, nir and optional ISO `date` columns, one row per acquisition
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    scenes, dates = [], []
+    with open(manifest_path, newline="") as f:
+        for row in csv.DictReader(f):
+            scenes.append((os.path.join(base_dir, row["red"]), os.path.join(base_dir, row["nir"])))
+            if row.get("date"):
+                dates.append(date.fromisoformat(row["date"]))
+    if dates and len(dates) == len(scenes):
+        order = np.argsort(dates)
+        scenes = [scenes[i] for i in order]
+        dates = [dates[i] for i in order]
+        return scenes, [(d - dates[0]).days for d in dates]
+    return scenes, None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Temporal NDVI aggregates over a stack of co-registered scenes.")
+    parser.add_argument("manifest", help="CSV with red,nir[,date] columns in acquisition order")
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--baseline", type=int, default=0, help="Index of the baseline scene for change detection")
+    parser.add_argument("--block-size", type=int, default=512)
+    args = parser.parse_args(argv)
+
+    scenes, times = read_stack_manifest(args.manifest)
+    for name, path in process_stack(scenes, args.output_dir, times, args.baseline, args.block_size).items():
+        print(f"{name}: {path}")
+
+if __name__ == "__main__":
+    main()
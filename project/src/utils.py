@@ -1,6 +1,7 @@
-import matplotlib.pyplot as plt
+import io
+import warnings
 import numpy as np
-import plotly.express as px
+from .summary import NDVIAccumulator, summarize_ndvi
 
 def create_ndvi_colormap():
     from matplotlib.colors import LinearSegmentedColormap
@@ -8,9 +9,60 @@ def create_ndvi_colormap():
     cmap = LinearSegmentedColormap.from_list("NDVI", colors, N=256)
     return cmap
 
+# Report maps are encoded once as WebP at a fixed dpi (a 10x10 inch figure
+# is roughly 1000 px square). Lossy suits the continuous NDVI map; the few
+# flat colours of a class map compress far better losslessly.
+REPORT_IMAGE_FORMAT = "webp"
+REPORT_IMAGE_MIME = "image/webp"
+
+def encode_figure(fig, dpi=100, lossless=False, quality=85):
+    buf = io.BytesIO()
+    pil_kwargs = {'lossless': True} if lossless else {'quality': quality}
+    fig.savefig(buf, format=REPORT_IMAGE_FORMAT, dpi=dpi, bbox_inches='tight', pil_kwargs=pil_kwargs)
+    return buf.getvalue()
+
 def plot_ndvi_histogram(ndvi_data):
-    flat_ndvi = ndvi_data.flatten()
-    flat_ndvi = flat_ndvi[~np.isnan(flat_ndvi)]
-    fig = px.histogram(flat_ndvi, nbins=50, title="Spectral Distribution", labels={'value': 'NDVI', 'count': 'Frequency'})
-    fig.update_layout(showlegend=False)
+    # Accepts an NDVI array or a pre-filled NDVIAccumulator; only the binned
+    # counts are sent to the browser, never the raw pixel values.
+    import plotly.express as px
+    accumulator = ndvi_data if isinstance(ndvi_data, NDVIAccumulator) else summarize_ndvi(ndvi_data)
+    fig = px.bar(x=accumulator.bin_centers, y=accumulator.counts, title="Spectral Distribution", labels={'x': 'NDVI', 'y': 'Frequency'})
+    fig.update_layout(showlegend=False, bargap=0)
     return fig
+
+def downsample(data, reducer="mean"):
+    # Halve both dimensions. "mean" averages 2x2 blocks ignoring NaN (for
+    # continuous NDVI); "nearest" keeps every other pixel (for class labels),
+    # copied so a coarse level does not keep the full-size array alive.
+    if reducer == "nearest":
+        return np.ascontiguousarray(data[::2, ::2])
+    h, w = data.shape
+    padded = np.pad(data.astype(np.float32, copy=False), ((0, h % 2), (0, w % 2)), mode="edge")
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(blocks, axis=(1, 3))
+
+def build_pyramid(data, min_size=256, reducer="mean"):
+    levels = [data]
+    while max(levels[-1].shape) > min_size:
+        levels.append(downsample(levels[-1], reducer))
+    return levels
+
+def display_view(pyramid, display_px=1024, zoom=1, center=(0.5, 0.5)):
+    # Pick the coarsest level that still has at least `display_px` pixels
+    # across the visible region, so rendering cost follows the figure size
+    # rather than the scene size. Zooming in switches to finer levels.
+    full_h, full_w = pyramid[0].shape
+    view_h, view_w = max(1, round(full_h / zoom)), max(1, round(full_w / zoom))
+    level = 0
+    while level + 1 < len(pyramid) and max(view_h, view_w) / 2 ** (level + 1) >= display_px:
+        level += 1
+
+    top = int(np.clip(center[1] * full_h - view_h / 2, 0, full_h - view_h))
+    left = int(np.clip(center[0] * full_w - view_w / 2, 0, full_w - view_w))
+    scale = 2 ** level
+    image = pyramid[level][top // scale:-(-(top + view_h) // scale), left // scale:-(-(left + view_w) // scale)]
+    extent = (left, left + view_w, top + view_h, top)
+    return image, extent
+
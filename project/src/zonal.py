@@ -0,0 +1,129 @@
+import argparse
+import csv
+import json
+import os
+import numpy as np
+from rasterio.crs import CRS
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from . import analysis, processing
+from .cache import content_key
+
+def load_zones(geojson_path, id_field=None):
+    with open(geojson_path) as f:
+        collection = json.load(f)
+    features = collection["features"] if collection.get("type") == "FeatureCollection" else [collection]
+    geometries, zone_ids = [], []
+    for i, feature in enumerate(features):
+        geometries.append(feature["geometry"])
+        properties = feature.get("properties") or {}
+        zone_ids.append(properties.get(id_field, i + 1) if id_field else i + 1)
+    return geometries, zone_ids
+
+def rasterize_zones(geometries, meta, zones_crs="EPSG:4326", cache_dir=None):
+    # Zone i (1-based, in input order) is burned as value i, 0 is outside every
+    # zone; where polygons overlap the later feature wins. The index depends
+    # only on the polygons and the raster grid, so it is cached as .npy keyed
+    # on both and memory-mapped on later runs.
+    shape = (meta['height'], meta['width'])
+    key = content_key(
+        json.dumps(geometries, sort_keys=True), zones_crs, tuple(meta['transform']), shape,
+        meta['crs'].to_wkt() if meta.get('crs') else None,
+    )
+    cache_path = os.path.join(cache_dir, f"zones_{key}.npy") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        return np.load(cache_path, mmap_mode='r')
+
+    if meta.get('crs') and zones_crs and CRS.from_user_input(zones_crs) != meta['crs']:
+        geometries = [transform_geom(zones_crs, meta['crs'], geom) for geom in geometries]
+    dtype = np.uint16 if len(geometries) < 2 ** 16 else np.uint32
+    zone_index = rasterize(
+        ((geom, i) for i, geom in enumerate(geometries, start=1)),
+        out_shape=shape, transform=meta['transform'], fill=0, dtype=dtype,
+    )
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".part.npy"
+        np.save(tmp_path, zone_index)
+        os.replace(tmp_path, cache_path)
+    return zone_index
+
+def zonal_statistics(zone_index, n_zones, ndvi=None, classified_map=None, n_classes=None,
+                     pixel_area=None, block_rows=1024):
+    # Accumulates per-zone sums with bincount over row blocks, so temporaries
+    # stay block-sized. `pixel_area` is a scalar or an array broadcastable to
+    # the map (km^2 per pixel); zone 0 (outside all polygons) is dropped.
+    size = n_zones + 1
+    pixels = np.zeros(size)
+    area = np.zeros(size)
+    ndvi_count = np.zeros(size)
+    ndvi_sum = np.zeros(size)
+    if classified_map is not None and n_classes is None:
+        n_classes = int(classified_map.max()) + 1
+    class_area = np.zeros((size, n_classes or 0))
+    pixel_area = np.broadcast_to(1.0 if pixel_area is None else pixel_area, zone_index.shape)
+
+    for row in range(0, zone_index.shape[0], block_rows):
+        rows = slice(row, row + block_rows)
+        zones = np.asarray(zone_index[rows]).ravel().astype(np.intp)
+        weights = np.asarray(pixel_area[rows]).ravel()
+        pixels += np.bincount(zones, minlength=size)
+        area += np.bincount(zones, weights=weights, minlength=size)
+
+        if ndvi is not None:
+            values = np.asarray(ndvi[rows]).ravel()
+            valid = ~np.isnan(values)
+            ndvi_count += np.bincount(zones[valid], minlength=size)
+            ndvi_sum += np.bincount(zones[valid], weights=values[valid], minlength=size)
+
+        if classified_map is not None and n_classes:
+            labels = np.asarray(classified_map[rows]).ravel()
+            valid = labels >= 0
+            combined = zones[valid] * n_classes + labels[valid]
+            class_area += np.bincount(combined, weights=weights[valid], minlength=size * n_classes).reshape(size, n_classes)
+
+    results = []
+    for zone in range(1, size):
+        row = {"zone": zone, "pixels": int(pixels[zone]), "area_km2": round(float(area[zone]), 4)}
+        if ndvi is not None:
+            row["ndvi_mean"] = float(ndvi_sum[zone] / ndvi_count[zone]) if ndvi_count[zone] else None
+        for label in range(n_classes or 0):
+            row[f"class_{label}_km2"] = round(float(class_area[zone, label]), 4)
+        results.append(row)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-zone NDVI and class-area statistics for GeoJSON polygons.")
+    parser.add_argument("zones", help="GeoJSON FeatureCollection of AOI polygons")
+    parser.add_argument("ndvi", help="NDVI GeoTIFF")
+    parser.add_argument("--id-field", help="Feature property used as the zone identifier")
+    parser.add_argument("--zones-crs", default="EPSG:4326", help="CRS of the GeoJSON coordinates")
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--engine", choices=analysis.CLUSTERING_ENGINES, default="histogram")
+    parser.add_argument("--cache-dir", default=".zone_cache")
+    parser.add_argument("--output", default="zonal_stats.csv")
+    args = parser.parse_args(argv)
+
+    geometries, zone_ids = load_zones(args.zones, args.id_field)
+    band, meta = processing.load_band(args.ndvi, dtype=None)
+    ndvi = processing.decode_ndvi(band, meta)
+    classified_map, centers = analysis.perform_kmeans_clustering(ndvi, n_clusters=args.clusters, engine=args.engine)
+
+    pixel_area = analysis.pixel_area_from_meta(meta, ndvi.shape)
+    if pixel_area is None:
+        pixel_area = analysis.flat_pixel_area_km2(meta['transform'][0], meta['transform'][4])
+
+    zone_index = rasterize_zones(geometries, meta, args.zones_crs, args.cache_dir)
+    rows = zonal_statistics(zone_index, len(geometries), ndvi, classified_map, len(centers), pixel_area)
+    for row, zone_id in zip(rows, zone_ids):
+        row["zone"] = zone_id
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["zone"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Zonal statistics for {len(rows)} zones written to {args.output}")
+
+if __name__ == "__main__":
+    main()
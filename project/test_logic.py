@@ -1,7 +1,15 @@
 
 import os
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from src import processing, analysis, utils
+import rasterio
+import rasterio.windows
+from rasterio.enums import Resampling
+from src import processing, analysis, utils, summary, instrumentation, jobs, timeseries, indices, cache, zonal
+from src.generate_data import generate_sample_data
 
 def test_workflow():
     try:
@@ -22,17 +30,222 @@ def test_workflow():
 
         print("Calculating NDVI...")
         ndvi_image = processing.calculate_ndvi(red_band, nir_band)
-        print(f"NDVI range: {np.nanmin(ndvi_image)} to {np.nanmax(ndvi_image)}")
+        ndvi_summary = summary.summarize_ndvi(ndvi_image)
+        print(f"NDVI range: {ndvi_summary.min} to {ndvi_summary.max}")
+        assert ndvi_summary.min == np.nanmin(ndvi_image) and ndvi_summary.max == np.nanmax(ndvi_image)
 
         print("Performing K-Means Clustering...")
         classified_map, centers = analysis.perform_kmeans_clustering(ndvi_image, n_clusters=4)
         print("Clustering successful.")
 
+        print("Performing histogram K-Means Clustering...")
+        fast_map, fast_centers = analysis.perform_kmeans_clustering(ndvi_image, n_clusters=4, engine="histogram")
+        agreement = np.mean(fast_map == classified_map)
+        print(f"Histogram engine agreement with KMeans: {agreement:.4f}")
+        assert np.all(np.diff(np.ravel(fast_centers)) > 0)
+        assert classified_map.dtype == np.int8 and fast_map.dtype == np.int8
+
         print("Calculating Statistics...")
         pixel_size = meta_red['transform'][0]
         stats = analysis.calculate_area_statistics(classified_map, pixel_size, pixel_size)
         print(f"Statistics: {stats}")
 
+        pixel_area = analysis.pixel_area_grid(meta_red['transform'], classified_map.shape)
+        geodesic_stats = analysis.calculate_area_statistics(classified_map, pixel_size, pixel_size, pixel_area=pixel_area)
+        print(f"Geodesic Statistics: {geodesic_stats}")
+        assert geodesic_stats.keys() == stats.keys()
+
+        print("Calculating windowed NDVI...")
+        output_path = os.path.join(tempfile.gettempdir(), "ndvi_windowed.tif")
+        processing.calculate_ndvi_windowed(red_path, nir_path, output_path, block_size=128)
+        windowed_ndvi, _ = processing.load_band(output_path)
+        os.remove(output_path)
+        assert np.array_equal(windowed_ndvi, ndvi_image.astype(np.float32), equal_nan=True)
+        print("Windowed NDVI matches in-memory NDVI.")
+
+        print("Calculating parallel NDVI...")
+        processing.calculate_ndvi_parallel(red_path, nir_path, output_path, workers=4, block_size=128)
+        parallel_ndvi, _ = processing.load_band(output_path)
+        os.remove(output_path)
+        assert np.array_equal(parallel_ndvi, ndvi_image.astype(np.float32), equal_nan=True)
+        print("Parallel NDVI matches in-memory NDVI.")
+
+        print("Calculating float32 NDVI on native bands...")
+        red_native, _ = processing.load_band(red_path, dtype=None)
+        nir_native, _ = processing.load_band(nir_path, dtype=None)
+        ndvi_f32 = np.empty(red_native.shape, dtype=np.float32)
+        processing.calculate_ndvi_float32(red_native, nir_native, out=ndvi_f32)
+        assert np.allclose(ndvi_f32, ndvi_image, atol=1e-6, equal_nan=True)
+        print("Float32 NDVI matches in-memory NDVI.")
+
+        print("Checking native-dtype band access...")
+        native, _ = processing.load_band(red_path, dtype=None)
+        mapped, mapped_meta = processing.open_band(red_path)
+        assert isinstance(mapped, np.memmap) and np.array_equal(mapped, native)
+        window = rasterio.windows.Window(37, 101, 150, 90)
+        windowed, windowed_meta = processing.open_band(red_path, window=window)
+        assert np.array_equal(windowed, native[window.toslices()])
+        assert windowed_meta['transform'] == rasterio.windows.transform(window, mapped_meta['transform'])
+        with tempfile.TemporaryDirectory() as tiled_dir:
+            tiled_red, _ = generate_sample_data(tiled_dir, seed=3, tiled=True, blocksize=128, compress="deflate")
+            tiled_native, _ = processing.load_band(tiled_red, dtype=None)
+            tiled_band, _ = processing.open_band(tiled_red)
+            assert not isinstance(tiled_band, np.memmap) and np.array_equal(tiled_band, tiled_native)
+            with rasterio.open(tiled_red, 'r+') as dst:
+                dst.build_overviews([2, 4], Resampling.average)
+            with rasterio.open(tiled_red, overview_level=0) as src:
+                overview_native = src.read(1)
+            overview, overview_meta = processing.open_band(tiled_red, overview_level=0)
+            assert overview.shape == (250, 250) and np.array_equal(overview, overview_native)
+        print("open_band matches load_band for mmap, window, tiled and overview reads.")
+
+        print("Aligning a half-resolution NIR band...")
+        with rasterio.open(nir_path) as src:
+            coarse_meta = src.meta.copy()
+            coarse_meta.update(width=src.width // 2, height=src.height // 2, transform=src.transform @ src.transform.scale(2, 2))
+            coarse = src.read(1, out_shape=(coarse_meta['height'], coarse_meta['width']), resampling=Resampling.average)
+        coarse_path = os.path.join(tempfile.gettempdir(), "nir_coarse.tif")
+        with rasterio.open(coarse_path, 'w', **coarse_meta) as dst:
+            dst.write(coarse, 1)
+        assert not processing.band_grids_match(red_path, coarse_path)
+        aligned_ndvi, aligned_meta = processing.calculate_ndvi_aligned(red_path, coarse_path, block_size=128)
+        os.remove(coarse_path)
+        assert aligned_ndvi.shape == ndvi_image.shape and aligned_meta['transform'] == meta_red['transform']
+        same_grid_ndvi, _ = processing.calculate_ndvi_aligned(red_path, nir_path)
+        assert np.array_equal(same_grid_ndvi, ndvi_image, equal_nan=True)
+        print("Aligned NDVI is on the red band grid.")
+
+        print("Recording stage instrumentation...")
+        with instrumentation.stage("calculate_ndvi", scene="smoke"):
+            processing.calculate_ndvi(red_native, nir_native)
+        record = instrumentation.RECORDER.records(scene="smoke")[-1]
+        assert record["status"] == "ok" and record["wall_s"] >= 0
+        # RSS fields are None where /proc is unavailable
+        assert record["peak_rss_mb"] is None or record["peak_rss_mb"] > 0
+        print(f"Stage record: {record}")
+
+        print("Checking failed jobs are kept until retried...")
+        job_manager = jobs.JobManager(max_workers=1)
+        runs = []
+        def failing(report):
+            runs.append(1)
+            raise ValueError("bad input")
+        job = job_manager.submit("smoke", failing)
+        while not job.done:
+            time.sleep(0.01)
+        assert job_manager.find("smoke") is job and job.status == "failed"
+        assert job_manager.submit("smoke", failing) is job and len(runs) == 1
+        retried = job_manager.submit("smoke", failing, replace=True)
+        while not retried.done:
+            time.sleep(0.01)
+        assert retried is not job and len(runs) == 2
+        print("Failed job stays visible and reruns only on request.")
+
+        print("Writing Cloud-optimized GeoTIFFs from NDVI with gaps...")
+        gappy = np.linspace(-1, 1, 512 * 512).reshape(512, 512)
+        gappy[::2, ::2] = np.nan
+        cog_meta = dict(meta_red, width=512, height=512)
+        with tempfile.TemporaryDirectory() as cog_dir:
+            float_path = os.path.join(cog_dir, "ndvi_f32.tif")
+            processing.save_cog(gappy, cog_meta, float_path, blocksize=128)
+            with rasterio.open(float_path, overview_level=0) as src:
+                overview = src.read(1, masked=True).filled(np.nan)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                expected = np.nanmean(gappy.astype(np.float32).reshape(256, 2, 256, 2), axis=(1, 3))
+            assert np.allclose(overview, expected, atol=1e-6, equal_nan=True)
+
+            int16_path = os.path.join(cog_dir, "ndvi_i16.tif")
+            processing.save_cog(gappy, cog_meta, int16_path, blocksize=128, scale_int16=True)
+            band, int16_meta = processing.load_band(int16_path, dtype=None)
+            decoded = processing.decode_ndvi(band, int16_meta)
+            assert np.allclose(decoded, gappy, atol=0.5 / processing.NDVI_INT16_SCALE + 1e-7, equal_nan=True)
+        print("COG overviews average around NaN and int16 round-trips.")
+
+        print("Computing temporal aggregates over a small stack...")
+        with tempfile.TemporaryDirectory() as stack_dir:
+            # Scenes declare nodata=0 like Sentinel-2 L2A; scene 3 repeats scene 1
+            scene_meta = dict(meta_red, nodata=0)
+            nir_later = os.path.join(stack_dir, "nir_later.tif")
+            with rasterio.open(nir_later, 'w', **scene_meta) as dst:
+                dst.write((nir_band * 1.2).astype(scene_meta['dtype']), 1)
+            red_copy, nir_copy = os.path.join(stack_dir, "red.tif"), os.path.join(stack_dir, "nir.tif")
+            for path, band in ((red_copy, red_band), (nir_copy, nir_band)):
+                with rasterio.open(path, 'w', **scene_meta) as dst:
+                    dst.write(band.astype(scene_meta['dtype']), 1)
+            scenes = [(red_copy, nir_copy), (red_copy, nir_later), (red_copy, nir_copy)]
+            times = np.array([0.0, 1.0, 3.0])
+            outputs = timeseries.process_stack(scenes, os.path.join(stack_dir, "out"), times, block_size=128)
+
+            stack_ndvi = np.stack([
+                processing.calculate_ndvi(processing.load_band(r)[0], processing.load_band(n)[0]) for r, n in scenes
+            ])
+            t_dev = (times - times.mean()).reshape(-1, 1, 1)
+            expected_slope = (t_dev * (stack_ndvi - stack_ndvi.mean(axis=0))).sum(axis=0) / (t_dev ** 2).sum()
+            for name, expected in (("change", stack_ndvi[-1] - stack_ndvi[0]), ("slope", expected_slope)):
+                with rasterio.open(outputs[name]) as src:
+                    result = src.read(1, masked=True)
+                assert np.isnan(src.nodata)
+                assert np.array_equal(result.mask, np.isnan(expected))
+                assert np.allclose(result.filled(np.nan), expected, atol=1e-6, equal_nan=True)
+        print("Change and slope match NumPy and zero change is not masked.")
+
+        print("Evaluating registered spectral indices...")
+        blue_band = np.abs(red_band - 0.5 * nir_band) + 1
+        terms = indices.BandTerms({"red": red_band, "nir": nir_band, "blue": blue_band}, scale=1e-4)
+        assert np.array_equal(indices.INDICES["ndvi"][1](terms), ndvi_image, equal_nan=True)
+        r, n, b = red_band * 1e-4, nir_band * 1e-4, blue_band * 1e-4
+        with np.errstate(divide='ignore', invalid='ignore'):
+            assert np.allclose(indices.INDICES["savi"][1](terms), 1.5 * (n - r) / (n + r + 0.5), equal_nan=True)
+            assert np.allclose(indices.INDICES["evi"][1](terms), 2.5 * (n - r) / (n + 6 * r - 7.5 * b + 1), equal_nan=True)
+        with tempfile.TemporaryDirectory() as index_dir:
+            index_path = indices.compute_indices(
+                indices.separate_band_sources(red=red_path, nir=nir_path), ["ndvi", "savi"],
+                os.path.join(index_dir, "indices.tif"), block_size=128,
+            )
+            with rasterio.open(index_path) as src:
+                assert np.isnan(src.nodata)
+                assert np.array_equal(src.read(1), ndvi_image.astype(np.float32), equal_nan=True)
+        print("Registry NDVI matches calculate_ndvi; SAVI and EVI match the reflectance formulas.")
+
+        print("Checking concurrent cache misses compute once...")
+        result_cache = cache.ResultCache(max_bytes=1024 ** 2)
+        computed = []
+        def slow_compute():
+            computed.append(1)
+            time.sleep(0.2)
+            return np.zeros(10)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            values = list(executor.map(lambda _: result_cache.get_or_compute("scene", slow_compute), range(4)))
+        assert len(computed) == 1 and all(v is values[0] for v in values)
+        print("Concurrent requests for one key shared a single computation.")
+
+        print("Checking zonal statistics against direct masks...")
+        t = meta_red['transform']
+        def pixel_box(row0, row1, col0, col1):
+            # Polygon on pixel edges, so exactly these rows and columns are burned
+            x0, x1 = t.c + col0 * t.a, t.c + col1 * t.a
+            y0, y1 = t.f + row0 * t.e, t.f + row1 * t.e
+            return {"type": "Polygon", "coordinates": [[(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]]}
+        boxes = [(10, 100, 20, 120), (200, 300, 300, 350)]
+        geometries = [pixel_box(*box) for box in boxes]
+        zones_dir = tempfile.mkdtemp()
+        zone_index = zonal.rasterize_zones(geometries, meta_red, cache_dir=zones_dir)
+        pixel_area = analysis.pixel_area_from_meta(meta_red, classified_map.shape)
+        rows = zonal.zonal_statistics(zone_index, len(geometries), ndvi_image, classified_map, 4, pixel_area, block_rows=64)
+        area_grid = np.broadcast_to(pixel_area, classified_map.shape)
+        for row, (r0, r1, c0, c1) in zip(rows, boxes):
+            mask = np.zeros(classified_map.shape, dtype=bool)
+            mask[r0:r1, c0:c1] = True
+            assert row["pixels"] == mask.sum()
+            assert abs(row["area_km2"] - area_grid[mask].sum()) < 1e-4
+            assert np.isclose(row["ndvi_mean"], np.nanmean(ndvi_image[mask]))
+            for label in range(4):
+                assert abs(row[f"class_{label}_km2"] - area_grid[mask & (classified_map == label)].sum()) < 1e-4
+        cached_index = zonal.rasterize_zones(geometries, meta_red, cache_dir=zones_dir)
+        assert isinstance(cached_index, np.memmap) and np.array_equal(cached_index, zone_index)
+        print("Zone pixels, areas and class areas match direct masks; the zone index is reused from cache.")
+
         print("SUCCESS: Full workflow completed.")
     except Exception as e:
         print(f"FAILURE: {e}")